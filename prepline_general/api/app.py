@@ -1,16 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status, HTTPException
 from fastapi.datastructures import FormData
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import logging
 import os
 import sentry_sdk
 
+from .compression import CompressionMiddleware
 from .general import router as general_router
+from .general import shutdown_multi_file_executor
 from .openapi import set_custom_openapi
 from fastapi.middleware.cors import CORSMiddleware
 from sentry_sdk.integrations.starlette import StarletteIntegration
 from sentry_sdk.integrations.fastapi import FastApiIntegration
+from .metrics import render_metrics
 from .pdf_extractor import router as pdf_extractor_router
+from .parallel_mode import shutdown_parallel_mode_dispatcher
+from .partition_engine import get_partition_engine, shutdown_partition_engine
 
 logger = logging.getLogger("unstructured_api")
 
@@ -40,6 +46,17 @@ sentry_sdk.init(
     ],
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Spawn the partition engine workers (when enabled) so models load before the first request
+    get_partition_engine()
+    yield
+    shutdown_parallel_mode_dispatcher()
+    shutdown_multi_file_executor()
+    shutdown_partition_engine()
+
+
 app = FastAPI(
     title="Unstructured Pipeline API",
     summary="Partition documents with the Unstructured library",
@@ -59,6 +76,7 @@ app = FastAPI(
         },
     ],
     openapi_tags=[{"name": "general"}, {"name": "pdf_extractor"}],
+    lifespan=lifespan,
 )
 
 # Note(austin) - This logger just dumps exceptions
@@ -90,6 +108,7 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 app.include_router(general_router)
 app.include_router(pdf_extractor_router, prefix="/extract", tags=["extract"])
 
@@ -157,4 +176,9 @@ def healthcheck(request: Request):
     return {"healthcheck": "HEALTHCHECK STATUS: EVERYTHING OK!"}
 
 
+@app.get("/metrics", status_code=status.HTTP_200_OK, include_in_schema=False)
+def metrics(request: Request):
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 logger.info("Started Unstructured API")
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import io
+from typing import Iterator, List, Sequence
+
+import pandas as pd
+from fastapi import HTTPException
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+ARROW_FORMATS = (ARROW_STREAM, PARQUET)
+
+
+def check_arrow_available(output_format: str) -> None:
+    """Reject the Arrow and Parquet output formats when `pyarrow` is not installed."""
+    if output_format in ARROW_FORMATS and pa is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Output format {output_format} requires the pyarrow package to be installed",
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    """File that keeps what is written to it until it is drained, for streaming a writer out."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # -- the position in the whole file, not in what is left since the last drain --
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Give `table` the columns of `schema`, in its order, with nulls for those it does not have."""
+    columns = [
+        (
+            table.column(field.name).cast(field.type)
+            if field.name in table.column_names
+            else pa.nulls(len(table), field.type)
+        )
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def iter_arrow_output(frames: Sequence[pd.DataFrame], output_format: str) -> Iterator[bytes]:
+    """Write the elements of every file as one Arrow stream or Parquet file, a file at a time.
+
+    Every file is a record batch, or a row group for Parquet, in upload order. The schema is the
+    union of the columns of every file, in order of first appearance, with types widened where
+    files disagree.
+    """
+    # -- the pandas metadata of a file would not match the columns of the joined schema --
+    tables = [
+        pa.Table.from_pandas(frame, preserve_index=False).replace_schema_metadata()
+        for frame in frames
+    ]
+    schema = pa.unify_schemas([table.schema for table in tables], promote_options="permissive")
+    sink = _ChunkSink()
+    writer = (
+        pq.ParquetWriter(sink, schema)
+        if output_format == PARQUET
+        else pa.ipc.new_stream(sink, schema)
+    )
+    for table in tables:
+        writer.write_table(_conform(table, schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
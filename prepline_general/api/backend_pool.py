@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from prepline_general.api.metrics import get_counter
+
+logger = logging.getLogger("unstructured_api")
+
+circuits_opened = get_counter(
+    "unstructured_parallel_mode_backend_circuits_opened_total",
+    "Times a parallel mode backend was taken out of rotation after consecutive failures.",
+)
+health_check_ejections = get_counter(
+    "unstructured_parallel_mode_backend_health_check_ejections_total",
+    "Times a parallel mode backend was taken out of rotation by a failed health check.",
+)
+
+
+class Backend:
+    """One api instance that page splits can be sent to, with its load and health."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+
+    @property
+    def healthcheck_url(self) -> str:
+        url = httpx.URL(self.url)
+        return str(url.copy_with(path="/healthcheck", query=None))
+
+    def is_available(self, now: float) -> bool:
+        """True when the backend is in rotation, or its circuit is ready for a trial request."""
+        if not self.healthy:
+            return False
+        if self.open_until == 0:
+            return True
+        return now >= self.open_until and not self.trial_in_flight
+
+
+class BackendPool:
+    """Spread page splits over the parallel mode backends by their outstanding requests.
+
+    Backends are listed comma separated in `UNSTRUCTURED_PARALLEL_MODE_URL`, or one per line in the
+    discovery file `UNSTRUCTURED_PARALLEL_MODE_URL_FILE`, which is re-read when it changes. Each
+    backend has a circuit breaker: after `failure_threshold` consecutive failures it is left out
+    for `cooldown` seconds, then a single trial request decides whether it is back. Health checks
+    take backends out of rotation the same way. When no backend is available the pool fails open
+    and uses the one that is due back first, so a single backend behaves as before.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._backends: Dict[str, Backend] = {}
+        self._source: Optional[Tuple[str, float]] = None
+        self._lock = Lock()
+        self._next = 0
+
+    def _read_urls(self) -> Tuple[Tuple[str, float], List[str]]:
+        if url_file := os.environ.get("UNSTRUCTURED_PARALLEL_MODE_URL_FILE"):
+            try:
+                mtime = os.path.getmtime(url_file)
+            except OSError:
+                raise HTTPException(
+                    status_code=500, detail=f"Parallel mode url file {url_file} is missing!"
+                )
+            if self._source == (url_file, mtime):
+                return self._source, list(self._backends)
+            with open(url_file) as f:
+                lines = [line.split("#", 1)[0].strip() for line in f]
+            return (url_file, mtime), [line for line in lines if line]
+
+        urls = os.environ.get("UNSTRUCTURED_PARALLEL_MODE_URL", "")
+        return (urls, 0), [url.strip() for url in urls.split(",") if url.strip()]
+
+    def backends(self) -> List[Backend]:
+        """Return the configured backends, keeping the state of those that were already known."""
+        with self._lock:
+            source, urls = self._read_urls()
+            if source != self._source:
+                self._backends = {url: self._backends.get(url) or Backend(url) for url in urls}
+                self._source = source
+                if len(urls) > 1:
+                    logger.info(f"Parallel mode backends: {', '.join(urls)}")
+            return list(self._backends.values())
+
+    def _choose(self, exclude: Collection[Backend]) -> Backend:
+        backends = self.backends()
+        if not backends:
+            raise HTTPException(status_code=500, detail="Parallel mode enabled but no url set!")
+
+        with self._lock:
+            now = time.monotonic()
+            # -- rotate the starting point, so that ties don't always go to the first backend --
+            self._next += 1
+            start = self._next % len(backends)
+            ordered = backends[start:] + backends[:start]
+
+            candidates = [b for b in ordered if b not in exclude] or ordered
+            available = [b for b in candidates if b.is_available(now)]
+            if available:
+                backend = min(available, key=lambda b: b.outstanding)
+            else:
+                backend = min(candidates, key=lambda b: (not b.healthy, b.open_until))
+
+            if backend.open_until:
+                backend.trial_in_flight = True
+            backend.outstanding += 1
+            return backend
+
+    def _release(self, backend: Backend, failed: Optional[bool]) -> None:
+        with self._lock:
+            backend.outstanding -= 1
+            backend.trial_in_flight = False
+            if failed is None:
+                return
+            if not failed:
+                backend.consecutive_failures = 0
+                backend.open_until = 0.0
+                return
+
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.failure_threshold:
+                if not backend.open_until or time.monotonic() >= backend.open_until:
+                    circuits_opened.inc()
+                    logger.warning(
+                        f"Parallel mode backend {backend.url} failed"
+                        f" {backend.consecutive_failures} times in a row, pausing it for"
+                        f" {self.cooldown}s"
+                    )
+                backend.open_until = time.monotonic() + self.cooldown
+
+    @contextmanager
+    def lease(self, exclude: Collection[Backend] = ()) -> Iterator[Backend]:
+        """Hold the least loaded available backend for one request.
+
+        Backends in `exclude` are only used when there is no other. The request counts as a
+        failure of the backend when it raises a 5xx or network error, a 4xx error says nothing
+        about the backend.
+        """
+        backend = self._choose(exclude)
+        failed: Optional[bool] = None
+        try:
+            yield backend
+            failed = False
+        except HTTPException as e:
+            failed = e.status_code >= 500
+            raise
+        finally:
+            self._release(backend, failed)
+
+    async def check_health(self, client: httpx.AsyncClient, timeout: float = 5) -> None:
+        """Probe the health check of every backend, when there is more than one to choose from."""
+        backends = self.backends()
+        if len(backends) < 2:
+            return
+
+        async def probe(backend: Backend) -> None:
+            try:
+                response = await client.get(backend.healthcheck_url, timeout=timeout)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+
+            if backend.healthy and not healthy:
+                health_check_ejections.inc()
+                logger.warning(f"Parallel mode backend {backend.url} failed its health check")
+            backend.healthy = healthy
+
+        await asyncio.gather(*(probe(backend) for backend in backends))
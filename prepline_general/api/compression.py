@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import os
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+# -- the compressed output of a response with a `Content-Length` is flushed to the client once this
+# -- much was written since the last flush, and bodies at least this large are compressed in a
+# -- worker thread rather than on the loop
+CHUNK_SIZE = 16 * 1024
+
+
+class Encoder(ABC):
+    """Streaming compressor for one response body."""
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes: ...
+
+    @abstractmethod
+    def flush(self) -> bytes:
+        """Return everything compressed so far, so the client can decode it without waiting."""
+
+    @abstractmethod
+    def finish(self) -> bytes: ...
+
+
+class GzipEncoder(Encoder):
+    def __init__(self, level: int):
+        # -- wbits 16 + 15 writes the gzip header and trailer around the deflate stream --
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder(Encoder):
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder(Encoder):
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def get_encoders() -> Dict[str, Tuple[Callable[[int], Encoder], int]]:
+    """Return the available encodings, by server preference, with their default level.
+
+    `br` and `zstd` are only offered when the `brotli` and `zstandard` packages are installed.
+    """
+    encoders: Dict[str, Tuple[Callable[[int], Encoder], int]] = {}
+    if zstandard is not None:
+        encoders["zstd"] = (ZstdEncoder, 3)
+    if brotli is not None:
+        encoders["br"] = (BrotliEncoder, 4)
+    encoders["gzip"] = (GzipEncoder, 6)
+    return encoders
+
+
+def choose_encoding(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    """Pick the encoding of `encodings` the client prefers in its `Accept-Encoding` header.
+
+    Ties in the client preference go to the first of `encodings`. None when the client accepts
+    none of them, or did not send the header.
+    """
+    preferences: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        preferences[name] = quality
+
+    wildcard = preferences.get("*", 0.0)
+    ranked = [
+        (preferences.get(encoding, wildcard), -index, encoding)
+        for index, encoding in enumerate(encodings)
+    ]
+    quality, _, encoding = max(ranked, default=(0.0, 0, None))
+    return encoding if quality > 0 else None
+
+
+class CompressionMiddleware:
+    """Compress responses with the encoding negotiated from `Accept-Encoding`.
+
+    Bodies are compressed as they are sent, so streamed responses, like multipart parts or ndjson
+    lines, stay streamed. A response with a `Content-Length` is only compressed once its body
+    reaches `min_size` bytes, and its compressed output is flushed every `CHUNK_SIZE` bytes of
+    input. A streamed response, one without a `Content-Length`, is compressed from its first
+    message, unless that message is the whole body and smaller than `min_size`, and is flushed to
+    the client with every message, so every part or line arrives as soon as it is sent.
+    Compression of large bodies runs in a worker thread, off the event loop. Responses that
+    already have a `Content-Encoding` are left alone.
+
+    Configured by `UNSTRUCTURED_COMPRESSION_MIN_SIZE`, where a negative value turns compression
+    off, and the level of every encoding by `UNSTRUCTURED_COMPRESSION_LEVEL_<ENCODING>`, like
+    `UNSTRUCTURED_COMPRESSION_LEVEL_GZIP`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.min_size = int(os.environ.get("UNSTRUCTURED_COMPRESSION_MIN_SIZE", 1024))
+        self.encoders = {
+            encoding: (
+                encoder,
+                int(os.environ.get(f"UNSTRUCTURED_COMPRESSION_LEVEL_{encoding.upper()}", level)),
+            )
+            for encoding, (encoder, level) in get_encoders().items()
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.min_size < 0:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = choose_encoding(accept_encoding, list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        encoder, level = self.encoders[encoding]
+        responder = _CompressionResponder(send, encoding, lambda: encoder(level), self.min_size)
+        await self.app(scope, receive, responder.send)
+
+
+async def _run(func: Callable[[bytes], bytes], data: bytes) -> bytes:
+    if len(data) >= CHUNK_SIZE:
+        return await anyio.to_thread.run_sync(func, data)
+    return func(data)
+
+
+class _CompressionResponder:
+    """Compress the body of one response on its way to `send`."""
+
+    def __init__(
+        self, send: Send, encoding: str, make_encoder: Callable[[], Encoder], min_size: int
+    ):
+        self._send = send
+        self.encoding = encoding
+        self.make_encoder = make_encoder
+        self.min_size = min_size
+        self.start_message: Optional[Message] = None
+        self.encoder: Optional[Encoder] = None
+        self.pending: List[bytes] = []
+        self.pending_size = 0
+        self.unflushed_size = 0
+        self.streamed = False
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_length = headers.get("content-length")
+            if "content-encoding" in headers or (
+                content_length is not None and int(content_length) < self.min_size
+            ):
+                self.passthrough = True
+                await self._send(message)
+                return
+            self.start_message = message
+            self.streamed = content_length is None
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if self.encoder is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            # -- a streamed response is not held back, its size is only known once it is sent --
+            if self.pending_size < self.min_size and not (self.streamed and more_body):
+                if more_body:
+                    return
+                # -- too small to be worth compressing, send it as it is --
+                await self._send_start(compressed=False)
+                await self._send({"type": "http.response.body", "body": b"".join(self.pending)})
+                return
+            self.encoder = self.make_encoder()
+            await self._send_start(compressed=True)
+            body = b"".join(self.pending)
+            self.pending = []
+
+        encoder = self.encoder
+        output = await _run(encoder.compress, body)
+        self.unflushed_size += len(body)
+        if not more_body:
+            output += encoder.finish()
+        elif self.streamed or self.unflushed_size >= CHUNK_SIZE:
+            output += encoder.flush()
+            self.unflushed_size = 0
+
+        if output or not more_body:
+            await self._send({"type": "http.response.body", "body": output, "more_body": more_body})
+
+    async def _send_start(self, compressed: bool) -> None:
+        message: Dict[str, Any] = dict(self.start_message or {})
+        headers = MutableHeaders(raw=list(message["headers"]))
+        if compressed:
+            headers["Content-Encoding"] = self.encoding
+            del headers["Content-Length"]
+        headers.add_vary_header("Accept-Encoding")
+        message["headers"] = headers.raw
+        await self._send(message)
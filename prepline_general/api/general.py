@@ -1,26 +1,49 @@
 from __future__ import annotations
 
+import asyncio
 import gzip
 import io
+import itertools
 import json
 import logging
 import mimetypes
 import os
 import secrets
 from base64 import b64encode
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import partial
-from typing import IO, Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union, cast
+from threading import Lock
+from typing import (
+    IO,
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    cast,
+)
 from unstructured.cleaners.core import clean
 
 import backoff
 import pandas as pd
 import psutil
-import requests
+import httpx
+import pypdfium2 as pdfium  # type: ignore
 import tiktoken
 from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, UploadFile, status
-from fastapi.responses import PlainTextResponse, StreamingResponse
-from pypdf import PageObject, PdfReader, PdfWriter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pypdf import PdfReader
 from pypdf.errors import FileNotDecryptedError, PdfReadError
 from starlette.datastructures import Headers
 from starlette.types import Send
@@ -29,27 +52,44 @@ from unstructured.partition.auto import partition
 from unstructured.partition.utils.constants import PartitionStrategy
 from unstructured.staging.base import (
     convert_to_dataframe,
-    convert_to_isd,
-    elements_from_json,
+    elements_from_dicts,
 )
 from unstructured_inference.models.base import UnknownModelException
 
 
 
+from prepline_general.api.arrow import ARROW_FORMATS, check_arrow_available, iter_arrow_output
+from prepline_general.api.backend_pool import Backend
 from prepline_general.api.filetypes import get_validated_mimetype
 from prepline_general.api.models.form_params import (
     GeneralFormParams,
     PartitionResponse,
     PartitionResponseMetadata,
 ) 
+from prepline_general.api.parallel_mode import get_parallel_mode_dispatcher
+from prepline_general.api.partition_engine import get_local_split_engine, get_partition_engine
+from prepline_general.api.postprocessing import (
+    ELEMENT_FIELDS,
+    CountTextStats,
+    ElementStage,
+    clean_text,
+    drop_empty_elements,
+    element_to_dict,
+    get_text_stats_cache,
+    project_metadata,
+    run_stages,
+    serialize_elements,
+    strip_metadata,
+)
+from prepline_general.api.splitters import (
+    DOCUMENT_SPLITTERS,
+    DocumentSplitter,
+    PdfSplitter,
+    pdfium_lock,
+)
 from prepline_general.api.utils import (
-    clean_credit_card_numbers,
-    clean_emails,
-    clean_phone_numbers,
-    count_words,
-    count_sentences,
-    count_paragraphs,
-    count_characters,
+    TEXT_METRICS,
+    scrub_pii,
 )
 
 app = FastAPI()
@@ -68,27 +108,211 @@ def is_compatible_response_type(media_type: str, response_type: type) -> bool:
 
 logger = logging.getLogger("unstructured_api")
 
+_multi_file_executor: Optional[ThreadPoolExecutor] = None
+_multi_file_thread_count = 0
+_multi_file_executor_lock = Lock()
 
-def get_pdf_splits(pdf_pages: Sequence[PageObject], split_size: int = 1):
-    """Given a pdf (PdfReader) with n pages, split it into pdfs each with split_size # of pages.
 
-    Return the files with their page offset in the form [(BytesIO, int)]
+def _get_multi_file_threads() -> int:
+    value = os.environ.get("UNSTRUCTURED_MULTI_FILE_THREADS", "1")
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(
+            f"UNSTRUCTURED_MULTI_FILE_THREADS must be an integer, got {value!r}. Partitioning the"
+            " files of a request one after another."
+        )
+        return 1
+
+
+def get_multi_file_executor() -> Optional[ThreadPoolExecutor]:
+    """Return the process-wide pool the files of a request are partitioned on, None when disabled.
+
+    `UNSTRUCTURED_MULTI_FILE_THREADS` is the number of threads of the pool, shared by all the
+    requests of this node, so it bounds the files partitioned at once however many requests come
+    in. With `1`, the default, the files of a request are partitioned one after another on the
+    request thread.
     """
-    offset = 0
+    global _multi_file_executor, _multi_file_thread_count
+
+    with _multi_file_executor_lock:
+        if _multi_file_executor is None:
+            thread_count = _get_multi_file_threads()
+            if thread_count <= 1:
+                return None
+            _multi_file_executor = ThreadPoolExecutor(
+                max_workers=thread_count, thread_name_prefix="multi-file"
+            )
+            _multi_file_thread_count = thread_count
+            logger.info(f"Started multi-file pool with {thread_count} threads")
+        return _multi_file_executor
+
+
+def shutdown_multi_file_executor() -> None:
+    global _multi_file_executor, _multi_file_thread_count
+
+    with _multi_file_executor_lock:
+        if _multi_file_executor is not None:
+            _multi_file_executor.shutdown(wait=False, cancel_futures=True)
+            _multi_file_executor = None
+            _multi_file_thread_count = 0
+
+
+def get_split_ranges(
+    page_count: int,
+    concurrency: int,
+    page_profiles: Optional[Sequence[PageProfile]] = None,
+    page_strategies: Optional[Sequence[str]] = None,
+) -> List[Tuple[int, int]]:
+    """Choose the page ranges [(start, end)] a pdf is split into in parallel mode.
+
+    `UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE` is the number of pages per split. When it is `auto`, the
+    ranges are sized per document instead, see `plan_split_ranges`. When `page_strategies` is
+    given, ranges are also cut wherever the strategy changes, so every split has a single one.
+    """
+    split_size = os.environ.get("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "1")
+
+    if split_size != "auto":
+        pages_per_pdf = int(split_size)
+        page_ranges = [
+            (offset, min(offset + pages_per_pdf, page_count))
+            for offset in range(0, page_count, pages_per_pdf)
+        ]
+    else:
+        page_ranges = plan_split_ranges(
+            _estimate_page_costs(page_count, page_profiles),
+            concurrency=concurrency,
+            min_pages=int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_MIN_SPLIT_SIZE", 1)),
+            max_pages=int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_MAX_SPLIT_SIZE", 50)),
+        )
+
+    if page_strategies is None:
+        return page_ranges
+
+    cut_ranges: List[Tuple[int, int]] = []
+    for start, end in page_ranges:
+        for page in range(start + 1, end):
+            if page_strategies[page] != page_strategies[page - 1]:
+                cut_ranges.append((start, page))
+                start = page
+        cut_ranges.append((start, end))
+    return cut_ranges
+
+
+def plan_split_ranges(
+    page_costs: Sequence[float], concurrency: int, min_pages: int = 1, max_pages: int = 50
+) -> List[Tuple[int, int]]:
+    """Group consecutive pages into ranges of about the same cost, one per sub-request.
+
+    The pages are spread over `concurrency` ranges, so that every worker gets one round trip, or
+    over more ranges when that would put more than `max_pages` pages in one. No range is shorter
+    than `min_pages`, except when the whole document is.
+    """
+    page_count = len(page_costs)
+    range_count = max(concurrency, -(-page_count // max_pages), 1)
+    cost_per_range = sum(page_costs) / range_count
+
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    cumulative_cost = 0.0
+    for index, page_cost in enumerate(page_costs):
+        cumulative_cost += page_cost
+        pages = index + 1 - start
+        # -- cut on the running total, so rounding doesn't pile up in the last range --
+        is_due = cumulative_cost >= (len(ranges) + 1) * cost_per_range - 1e-9
+        if pages >= max_pages or (pages >= min_pages and is_due):
+            ranges.append((start, index + 1))
+            start = index + 1
+
+    if start < page_count:
+        # -- a tail shorter than `min_pages` joins the previous range when it fits --
+        if ranges and page_count - start < min_pages and page_count - ranges[-1][0] <= max_pages:
+            ranges[-1] = (ranges[-1][0], page_count)
+        else:
+            ranges.append((start, page_count))
+
+    return ranges
+
+
+class PageProfile(NamedTuple):
+    """What the parallel mode pre-pass found out about a pdf page."""
+
+    char_count: int
+    image_coverage: float
+
+    @property
+    def is_scanned(self) -> bool:
+        """True when the text of the page can't be extracted from its text layer alone.
 
-    while offset < len(pdf_pages):
-        new_pdf = PdfWriter()
-        pdf_buffer = io.BytesIO()
+        That is when it has fewer than `UNSTRUCTURED_PARALLEL_MODE_MIN_TEXT_CHARS` characters, or
+        images cover at least `UNSTRUCTURED_PARALLEL_MODE_MAX_IMAGE_COVERAGE` of its area.
+        """
+        min_chars = int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_MIN_TEXT_CHARS", 1))
+        max_coverage = float(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_MAX_IMAGE_COVERAGE", 0.8))
+        return self.char_count < min_chars or self.image_coverage >= max_coverage
 
-        end = offset + split_size
-        for page in pdf_pages[offset:end]:
-            new_pdf.add_page(page)
 
-        new_pdf.write(pdf_buffer)
-        pdf_buffer.seek(0)
+def _get_scanned_page_cost() -> float:
+    return float(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_SCANNED_PAGE_COST", 1))
 
-        yield (pdf_buffer.read(), offset)
-        offset += split_size
+
+def _estimate_page_costs(
+    page_count: int, page_profiles: Optional[Sequence[PageProfile]] = None
+) -> List[float]:
+    """Estimate the relative partitioning cost of every page.
+
+    When `UNSTRUCTURED_PARALLEL_MODE_SCANNED_PAGE_COST` is above 1, scanned pages, which need OCR,
+    count as that many pages. Otherwise, or without `page_profiles`, every page costs the same.
+    """
+    scanned_page_cost = _get_scanned_page_cost()
+    if scanned_page_cost <= 1 or page_profiles is None:
+        return [1.0] * page_count
+
+    return [scanned_page_cost if profile.is_scanned else 1.0 for profile in page_profiles]
+
+
+def profile_pdf_pages(pdf: pdfium.PdfDocument, page_count: int) -> List[PageProfile]:
+    """Profile every page of a pdf from its text layer and images, without rendering it."""
+    page_profiles: List[PageProfile] = []
+    for index in range(page_count):
+        with pdfium_lock:
+            page = pdf[index]
+            text_page = page.get_textpage()
+            char_count = text_page.count_chars()
+            text_page.close()
+
+            width, height = page.get_size()
+            image_area = 0.0
+            for image in page.get_objects(filter=[pdfium.raw.FPDF_PAGEOBJ_IMAGE]):
+                # -- `get_pos` was renamed to `get_bounds` in pypdfium2 5 --
+                get_bounds = getattr(image, "get_bounds", None) or image.get_pos
+                left, bottom, right, top = get_bounds()
+                image_area += max(right - left, 0) * max(top - bottom, 0)
+            page.close()
+
+        page_area = width * height
+        image_coverage = min(image_area / page_area, 1.0) if page_area > 0 else 0.0
+        page_profiles.append(PageProfile(char_count, image_coverage))
+
+    return page_profiles
+
+
+def route_page_strategies(strategy: str, page_profiles: Sequence[PageProfile]) -> List[str]:
+    """Choose the partition strategy of every page of a pdf.
+
+    An explicit strategy is used for every page. With `auto`, pages with a text layer use `fast`,
+    and scanned pages use `UNSTRUCTURED_PARALLEL_MODE_SCANNED_PAGE_STRATEGY` (`hi_res` by default).
+    """
+    if strategy != PartitionStrategy.AUTO:
+        return [strategy] * len(page_profiles)
+
+    scanned_page_strategy = _validate_strategy(
+        os.environ.get("UNSTRUCTURED_PARALLEL_MODE_SCANNED_PAGE_STRATEGY", PartitionStrategy.HI_RES)
+    )
+    return [
+        scanned_page_strategy if profile.is_scanned else PartitionStrategy.FAST
+        for profile in page_profiles
+    ]
 
 
 # Do not retry with these status codes
@@ -107,7 +331,8 @@ def is_non_retryable(e: Exception) -> bool:
     giveup=is_non_retryable,
     logger=logger,
 )
-def call_api(
+async def call_api(
+    client: httpx.AsyncClient,
     request_url: str,
     api_key: str,
     filename: str,
@@ -118,12 +343,19 @@ def call_api(
     """Call the api with the given request_url."""
     headers = {"unstructured-api-key": api_key}
 
-    response = requests.post(
-        request_url,
-        files={"files": (filename, file, content_type)},
-        data=partition_kwargs,
-        headers=headers,
-    )
+    try:
+        response = await client.post(
+            request_url,
+            files={"files": (filename, file, content_type)},
+            # -- unset params are left out of the form, like `requests` does --
+            data={key: value for key, value in partition_kwargs.items() if value is not None},
+            headers=headers,
+        )
+    # -- surface network failures as retryable errors --
+    except httpx.TimeoutException as e:
+        raise HTTPException(status_code=504, detail=f"Parallel mode request timed out: {e!r}")
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=502, detail=f"Parallel mode request failed: {e!r}")
 
     if response.status_code != 200:
         detail = response.json().get("detail") or response.text
@@ -132,7 +364,7 @@ def call_api(
     return response.text
 
 
-def partition_file_via_api(
+async def partition_file_via_api(
     file_tuple: Tuple[IO[bytes], int],
     request: Request,
     filename: str,
@@ -141,7 +373,11 @@ def partition_file_via_api(
 ) -> List[Element]:
     """Send the given file to be partitioned remotely with retry logic.
 
-    The remote url is set by the `UNSTRUCTURED_PARALLEL_MODE_URL` environment variable.
+    The remote urls are set by the `UNSTRUCTURED_PARALLEL_MODE_URL` environment variable, or listed
+    in the `UNSTRUCTURED_PARALLEL_MODE_URL_FILE` discovery file. Each call goes to the backend with
+    the fewest outstanding requests, see `BackendPool`. The call holds a slot of the node-wide
+    parallel mode semaphore while it is in flight, a hedged duplicate of a straggling call shares
+    that slot.
 
     Args:
     `file_tuple` is a file-like object and byte offset of a page (file, page_offset)
@@ -151,24 +387,168 @@ def partition_file_via_api(
     """
     file, page_offset = file_tuple
 
-    request_url = os.environ.get("UNSTRUCTURED_PARALLEL_MODE_URL")
-    if not request_url:
-        raise HTTPException(status_code=500, detail="Parallel mode enabled but no url set!")
-
     api_key = request.headers.get("unstructured-api-key", default="")
     partition_kwargs["starting_page_number"] = (
         partition_kwargs.get("starting_page_number", 1) + page_offset
     )
+    # -- the merged elements are counted again here, so the backend need not count them --
+    partition_kwargs["metrics"] = "none"
+
+    dispatcher = get_parallel_mode_dispatcher()
+    used_backends: List[Backend] = []
+
+    async def send(is_hedge: bool) -> str:
+        # -- a duplicate must not read from the buffer the original call is still sending --
+        body = io.BytesIO(cast(io.BytesIO, file).getvalue()) if is_hedge else file
+        # -- and goes to another backend than the original, when there is one --
+        with dispatcher.backends.lease(exclude=used_backends) as backend:
+            used_backends.append(backend)
+            return await call_api(
+                dispatcher.client,
+                backend.url,
+                api_key,
+                filename,
+                body,
+                content_type,
+                **partition_kwargs,
+            )
 
-    result = call_api(
-        request_url,
-        api_key,
-        filename,
-        file,
-        content_type,
-        **partition_kwargs,
+    async with dispatcher.semaphore:
+        result = await dispatcher.hedge(send)
+    # -- a large response would stall the other sub-requests of the node-wide loop while parsed --
+    return await asyncio.get_running_loop().run_in_executor(None, _elements_from_response, result)
+
+
+def _elements_from_response(result: str) -> List[Element]:
+    """Parse the elements of an api response, which wraps them in a `documents` key."""
+    response = json.loads(result)
+    if isinstance(response, dict) and "documents" in response:
+        response = response["documents"]
+    return elements_from_dicts(response)
+
+
+async def partition_file_locally(
+    file_tuple: Tuple[IO[bytes], int],
+    filename: str,
+    content_type: str,
+    coordinates: bool,
+    in_process: bool = False,
+    **partition_kwargs: Any,
+) -> List[Element]:
+    """Partition the given file in the local partition engine, without an api call.
+
+    This is the counterpart of `partition_file_via_api` when `UNSTRUCTURED_PARALLEL_MODE_BACKEND`
+    is `local`. `coordinates` is only meaningful to the api and is dropped here, coordinates are
+    removed during post-processing of the merged elements instead. With `in_process`, the file is
+    partitioned in a thread of this process rather than in the engine.
+    """
+    file, page_offset = file_tuple
+
+    partition_kwargs["starting_page_number"] = (
+        partition_kwargs.get("starting_page_number", 1) + page_offset
     )
-    return elements_from_json(text=result)
+
+    local_partition = (
+        partial(partition, file=file)
+        if in_process
+        else partial(get_local_split_engine().partition, file)
+    )
+    return await asyncio.get_running_loop().run_in_executor(
+        None,
+        partial(
+            local_partition,
+            metadata_filename=filename,
+            content_type=content_type,
+            **partition_kwargs,
+        ),
+    )
+
+
+async def partition_split_with_recovery(
+    file_tuple: Tuple[IO[bytes], int],
+    partition_func: Callable[[Tuple[IO[bytes], int]], Awaitable[List[Element]]],
+    fallback_func: Optional[Callable[[Tuple[IO[bytes], int]], Awaitable[List[Element]]]],
+    starting_page_number: int,
+    splitter_class: Type[DocumentSplitter] = PdfSplitter,
+) -> Tuple[List[Element], List[int]]:
+    """Partition a split with `partition_func`, recovering from a failure as best it can.
+
+    A split that fails with a retryable error is halved with `splitter_class`, and each half is
+    partitioned again. A single page that still fails is handed to `fallback_func`, if any. Return
+    the elements that could be partitioned, and the page numbers that could not.
+    """
+    file, page_offset = file_tuple
+
+    try:
+        return await partition_func(file_tuple), []
+    except HTTPException as e:
+        if is_non_retryable(e):
+            raise
+        error: Exception = e
+        detail = e.detail
+
+    file.seek(0)
+    with splitter_class(file) as splitter:
+        page_count = splitter.page_count
+        middle = page_count // 2
+        halves = (
+            [
+                (half, page_offset + offset)
+                for half, offset in splitter.get_splits([(0, middle), (middle, page_count)])
+            ]
+            if page_count > 1
+            else []
+        )
+
+    first_page = starting_page_number + page_offset
+    if halves:
+        logger.warning(
+            f"Pages {first_page}-{first_page + page_count - 1} failed ({detail}), "
+            "retrying them in two halves"
+        )
+        results = await asyncio.gather(
+            *(
+                partition_split_with_recovery(
+                    half, partition_func, fallback_func, starting_page_number, splitter_class
+                )
+                for half in halves
+            )
+        )
+        return (
+            [element for elements, _ in results for element in elements],
+            [page for _, failed_pages in results for page in failed_pages],
+        )
+
+    if fallback_func is not None:
+        logger.warning(f"Page {first_page} failed ({detail}), partitioning it locally")
+        try:
+            return await fallback_func(file_tuple), []
+        except Exception as e:
+            error = e
+
+    logger.error(f"Page {first_page} could not be partitioned: {error!r}")
+    return [], [first_page]
+
+
+async def partition_split(
+    file_tuple: Tuple[IO[bytes], int],
+    partition_func: Callable[[Tuple[IO[bytes], int]], Awaitable[List[Element]]],
+) -> Tuple[List[Element], Optional[List[int]]]:
+    """Partition a pdf split with `partition_func`, a failure fails the whole document."""
+    return await partition_func(file_tuple), None
+
+
+def route_by_page(
+    partition_func: Callable[..., Awaitable[List[Element]]], page_strategies: Sequence[str]
+) -> Callable[[Tuple[IO[bytes], int]], Awaitable[List[Element]]]:
+    """Wrap `partition_func` to partition each split with the strategy of its first page."""
+
+    async def partition_routed(file_tuple: Tuple[IO[bytes], int]) -> List[Element]:
+        _, page_offset = file_tuple
+        return await partition_func(file_tuple, strategy=page_strategies[page_offset])
+
+    return partition_routed
+
 
 def pipeline_cleanup(
     text: str,
@@ -188,67 +568,201 @@ def pipeline_cleanup(
         extra_whitespace=clean_whitespaces,
     )
 
-    if delete_emails:
-        text = clean_emails(text)
+    return scrub_pii(
+        text,
+        delete_emails=delete_emails,
+        delete_credit_cards=delete_credit_cards,
+        delete_phone_numbers=delete_phone_numbers,
+    )
+
+
+@contextmanager
+def _invalid_document_as_http(splitter_class: Type[DocumentSplitter]) -> Iterator[None]:
+    """Report a document the splitter cannot read as a 422, like `_check_pdf` does for pdfs.
 
-    if delete_credit_cards:
-        text = clean_credit_card_numbers(text)
+    The splitters only parse the upload, and the libraries they use raise all sorts of errors for a
+    corrupt file, from `zipfile.BadZipFile` to `PIL.UnidentifiedImageError`.
+    """
+    try:
+        yield
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=422,
+            detail=f"File does not appear to be a valid {splitter_class.format_name}",
+        ) from e
 
-    if delete_phone_numbers:
-        text = clean_phone_numbers(text)
 
-    return text
+def _iter_splits(
+    splitter: DocumentSplitter, page_ranges: Sequence[Tuple[int, int]]
+) -> Iterator[Tuple[IO[bytes], int]]:
+    # -- a corrupt frame or sheet may only fail once the split holding it is built --
+    with _invalid_document_as_http(type(splitter)):
+        yield from splitter.get_splits(page_ranges)
 
 
-def partition_pdf_splits(
+def iter_split_partitions(
     request: Request,
-    pdf_pages: Sequence[PageObject],
     file: IO[bytes],
     metadata_filename: str,
     content_type: str,
     coordinates: bool,
     **partition_kwargs: Any,
-) -> List[Element]:
-    """Split a pdf into chunks and process in parallel with more api calls.
+) -> Iterator[Tuple[List[Element], Optional[List[int]]]]:
+    """Split a document into chunks and process in parallel with more api calls.
 
-    Or partition locally if the chunk is small enough. As soon as any remote call fails, bubble up
-    the error.
+    Pdfs are split by page, xlsx by sheet, pptx by slide and tiff by frame, see
+    `DOCUMENT_SPLITTERS`.
+
+    The elements of each chunk are yielded in page order, as soon as that chunk and all the earlier
+    ones are partitioned, along with the page numbers of the chunk that could not be partitioned,
+    or None when failed chunks are not recovered.
+
+    Or partition locally if the document fits in one chunk, in the partition engine when it is
+    enabled. As soon as any remote call fails, bubble up the error, unless
+    `UNSTRUCTURED_PARALLEL_MODE_PARTIAL_RESULTS` is `true`, in which case failed chunks are
+    recovered by `partition_split_with_recovery`. When
+    `UNSTRUCTURED_PARALLEL_MODE_BACKEND` is `local`, the chunks are partitioned in the local
+    partition engine processes instead of being sent to the api.
+
+    For a pdf with the `auto` strategy, a pre-pass routes every page to `fast` or, if it is
+    scanned, to a strategy that runs OCR, see `route_page_strategies`. Chunks never mix strategies.
 
     Arguments:
     request is used to forward relevant headers to the api calls
-    file, metadata_filename and content_type are passed on in the file argument to requests.post
+    file, metadata_filename and content_type are passed on in the file argument to the api calls
     coordinates is passed on to the api calls, but cannot be used in the local partition case
     partition_kwargs holds any others parameters that will be forwarded, or passed to partition
     """
-    pages_per_pdf = int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", 1))
+    is_local_backend = os.environ.get("UNSTRUCTURED_PARALLEL_MODE_BACKEND", "api") == "local"
+    strategy = partition_kwargs.pop("strategy", PartitionStrategy.AUTO)
 
-    # If it's small enough, just process locally
-    if len(pdf_pages) <= pages_per_pdf:
-        return partition(
-            file=file,
-            metadata_filename=metadata_filename,
+    if is_local_backend:
+        partition_func = partial(
+            partition_file_locally,
+            filename=metadata_filename,
+            content_type=content_type,
+            coordinates=coordinates,
+            **partition_kwargs,
+        )
+        # -- a split that crashed the engine must not be retried inside the server process --
+        fallback_func = None
+        window = get_local_split_engine().max_workers
+    else:
+        partition_func = partial(
+            partition_file_via_api,
+            request=request,
+            filename=metadata_filename,
+            content_type=content_type,
+            coordinates=coordinates,
+            **partition_kwargs,
+        )
+        fallback_func = partial(
+            partition_file_locally,
+            filename=metadata_filename,
             content_type=content_type,
+            coordinates=coordinates,
+            in_process=True,
             **partition_kwargs,
         )
+        # -- the node-wide semaphore bounds the calls actually in flight across documents --
+        window = int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_THREADS", 3))
+
+    partial_results = (
+        os.environ.get("UNSTRUCTURED_PARALLEL_MODE_PARTIAL_RESULTS", "false") == "true"
+    )
+    splitter_class = DOCUMENT_SPLITTERS[content_type]
+    with _invalid_document_as_http(splitter_class):
+        splitter = splitter_class(file)
+    with splitter:
+        page_count = splitter.page_count
+        page_profiles = (
+            profile_pdf_pages(splitter.pdf, page_count)
+            if isinstance(splitter, PdfSplitter)
+            and (strategy == PartitionStrategy.AUTO or _get_scanned_page_cost() > 1)
+            else None
+        )
+        page_strategies = (
+            route_page_strategies(strategy, page_profiles)
+            if page_profiles is not None
+            else [strategy] * page_count
+        )
+        page_ranges = get_split_ranges(
+            page_count,
+            concurrency=window,
+            page_profiles=page_profiles,
+            page_strategies=page_strategies,
+        )
+
+        # If it's small enough, just process locally, in the warm engine when it is enabled
+        if len(page_ranges) <= 1:
+            file.seek(0)
+            engine = get_partition_engine()
+            local_partition = (
+                partial(engine.partition, file) if engine else partial(partition, file=file)
+            )
+            elements = local_partition(
+                metadata_filename=metadata_filename,
+                content_type=content_type,
+                strategy=page_strategies[0] if page_strategies else strategy,
+                **partition_kwargs,
+            )
+            yield elements, [] if partial_results else None
+            return
+
+        split_func: Callable[
+            [Tuple[IO[bytes], int]], Awaitable[Tuple[List[Element], Optional[List[int]]]]
+        ]
+        if partial_results:
+            split_func = partial(
+                partition_split_with_recovery,
+                partition_func=route_by_page(partition_func, page_strategies),
+                fallback_func=(
+                    route_by_page(fallback_func, page_strategies) if fallback_func else None
+                ),
+                starting_page_number=partition_kwargs.get("starting_page_number", 1),
+                splitter_class=splitter_class,
+            )
+        else:
+            split_func = partial(
+                partition_split, partition_func=route_by_page(partition_func, page_strategies)
+            )
+
+        page_iterator = _iter_splits(splitter, page_ranges)
 
-    results: List[Element] = []
-    page_iterator = get_pdf_splits(pdf_pages, split_size=pages_per_pdf)
+        dispatcher = get_parallel_mode_dispatcher()
+        yield from dispatcher.map_in_order(split_func, page_iterator, window=window)
 
-    partition_func = partial(
-        partition_file_via_api,
+
+def partition_splits(
+    request: Request,
+    file: IO[bytes],
+    metadata_filename: str,
+    content_type: str,
+    coordinates: bool,
+    **partition_kwargs: Any,
+) -> Tuple[List[Element], Optional[List[int]]]:
+    """Split a document into chunks, process them in parallel and merge the elements in page order.
+
+    Return the elements, and the page numbers that could not be partitioned, or None when failed
+    chunks are not recovered.
+    """
+    elements: List[Element] = []
+    failed_pages: Optional[List[int]] = None
+    for split_elements, split_failed_pages in iter_split_partitions(
         request=request,
-        filename=metadata_filename,
+        file=file,
+        metadata_filename=metadata_filename,
         content_type=content_type,
         coordinates=coordinates,
         **partition_kwargs,
-    )
-
-    thread_count = int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_THREADS", 3))
-    with ThreadPoolExecutor(max_workers=thread_count) as executor:
-        for result in executor.map(partition_func, page_iterator):
-            results.extend(result)
-
-    return results
+    ):
+        elements.extend(split_elements)
+        if split_failed_pages is not None:
+            failed_pages = failed_pages if failed_pages is not None else []
+            failed_pages.extend(split_failed_pages)
+    return elements, failed_pages
 
 
 def pipeline_api(
@@ -287,7 +801,28 @@ def pipeline_api(
     clean_dashes: bool = False,
     clean_whitespaces: bool = False,
     include_slide_notes: Optional[bool] = True,
-) -> PartitionResponse:
+    stream_pdf_pages: bool = False,
+    metrics: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None,
+    metadata_fields: Optional[List[str]] = None,
+) -> (
+    PartitionResponse
+    | pd.DataFrame
+    | Iterator[str]
+    | Iterator[PartitionResponse | pd.DataFrame | Iterator[str]]
+):
+    """Partition `file` and return its post-processed elements.
+
+    With the `application/x-ndjson` response type, the response is an iterator of its lines, see
+    `_iter_ndjson_lines`.
+
+    When `stream_pdf_pages` is set, an iterator is returned instead, with one post-processed
+    response per chunk of pages, in page order. Only pdfs processed in parallel mode have more
+    than one chunk.
+
+    `fields` and `metadata_fields` select the keys of the elements and of their metadata in the
+    response, see `_validate_fields`.
+    """
     if filename.endswith(".msg"):
         # Note(yuming): convert file type for msg files
         # since fast api might sent the wrong one.
@@ -338,6 +873,10 @@ def pipeline_api(
                         "clean_dashes": clean_dashes,
                         "clean_whitespaces": clean_whitespaces,
                         "include_slide_notes": include_slide_notes,
+                        "stream_pdf_pages": stream_pdf_pages,
+                        "metrics": metrics,
+                        "fields": fields,
+                        "metadata_fields": metadata_fields,
                     },
                     default=str,
                 )
@@ -353,6 +892,8 @@ def pipeline_api(
         file.seek(0)
 
     strategy = _validate_strategy(strategy)
+    text_metrics = _validate_metrics(metrics)
+    element_fields, element_metadata_fields = _validate_fields(fields, metadata_fields)
     pdf_infer_table_structure = _set_pdf_infer_table_structure(
         pdf_infer_table_structure,
         strategy,
@@ -361,7 +902,7 @@ def pipeline_api(
 
     # Parallel mode is set by env variable
     enable_parallel_mode = os.environ.get("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "false")
-    pdf_parallel_mode_enabled = enable_parallel_mode == "true"
+    parallel_mode_enabled = enable_parallel_mode == "true"
     if starting_page_number is None:
         starting_page_number = 1
 
@@ -369,7 +910,25 @@ def pipeline_api(
 
     extract_image_block_to_payload = bool(extract_image_block_types)
 
-    try:
+    failed_pages: Optional[List[int]] = None
+    build_response = partial(
+        _build_partition_response,
+        filename=filename,
+        response_type=response_type,
+        coordinates=coordinates,
+        metrics=text_metrics,
+        fields=element_fields,
+        metadata_fields=element_metadata_fields,
+        delete_emails=delete_emails,
+        delete_credit_cards=delete_credit_cards,
+        delete_phone_numbers=delete_phone_numbers,
+        clean_bullet_points=clean_bullet_points,
+        clean_numbered_list=clean_numbered_list,
+        clean_dashes=clean_dashes,
+        clean_whitespaces=clean_whitespaces,
+    )
+
+    with _partition_errors_as_http(file_content_type, hi_res_model_name):
         logger.debug(
             "partition input data: {}".format(
                 json.dumps(
@@ -429,12 +988,27 @@ def pipeline_api(
             "include_slide_notes": include_slide_notes,
         }
 
-        if file_content_type == "application/pdf" and pdf_parallel_mode_enabled:
-            pdf = PdfReader(file)
-            partition_kwargs['strategy'] = PartitionStrategy.FAST
-            elements = partition_pdf_splits(
+        if file_content_type in DOCUMENT_SPLITTERS and parallel_mode_enabled:
+            if stream_pdf_pages:
+                # -- the upload is closed when the endpoint returns, before the pages are read --
+                file = io.BytesIO(file.read())
+                partition_kwargs["file"] = file
+                # -- chunks are partitioned lazily, while the response is being sent, but the first
+                # -- one is partitioned here, so a bad document still gets its error status
+                chunks = iter_split_partitions(
+                    request=request,
+                    coordinates=coordinates,
+                    **partition_kwargs,  # type: ignore # pyright: ignore[reportGeneralTypeIssues]
+                )
+                first_chunk = next(chunks)
+                return _iter_chunk_responses(
+                    itertools.chain([first_chunk], chunks),
+                    build_response,
+                    file_content_type,
+                    hi_res_model_name,
+                )
+            elements, failed_pages = partition_splits(
                 request=request,
-                pdf_pages=pdf.pages,
                 coordinates=coordinates,
                 **partition_kwargs,  # type: ignore # pyright: ignore[reportGeneralTypeIssues]
             )
@@ -442,9 +1016,119 @@ def pipeline_api(
         #     partition_kwargs['strategy'] = PartitionStrategy.FAST
 
         #     elements = partition_pdf(**partition_kwargs)
+        elif engine := get_partition_engine():
+            elements = engine.partition(**partition_kwargs)  # type: ignore # pyright: ignore[reportGeneralTypeIssues]
         else:
             elements = partition(**partition_kwargs)  # type: ignore # pyright: ignore[reportGeneralTypeIssues]
 
+    response = build_response(elements, failed_pages=failed_pages)
+    return iter([response]) if stream_pdf_pages else response
+
+
+def _build_partition_response(
+    elements: List[Element],
+    failed_pages: Optional[List[int]],
+    filename: str,
+    response_type: str,
+    coordinates: bool,
+    metrics: Sequence[str],
+    delete_emails: bool,
+    delete_credit_cards: bool,
+    delete_phone_numbers: bool,
+    clean_bullet_points: bool,
+    clean_numbered_list: bool,
+    clean_dashes: bool,
+    clean_whitespaces: bool,
+    fields: Optional[Sequence[str]] = None,
+    metadata_fields: Optional[Sequence[str]] = None,
+) -> PartitionResponse | pd.DataFrame | Iterator[str]:
+    """Clean up partitioned elements and count their words, tokens, etc. into the response.
+
+    The elements flow one by one through the stages of `postprocessing`, so they are only collected
+    again into the response itself.
+
+    Only the counters in `metrics` are computed, the others are left out of the element metadata
+    and are None in the response metadata. The elements only keep the keys in `fields` and the
+    metadata in `metadata_fields`, all of them when None. The counts of the whole document are
+    still computed when the elements leave theirs out, except for the formats that cannot report
+    them.
+
+    The csv, Arrow and Parquet formats are returned as a DataFrame, so that several files can be
+    joined without parsing them again. `failed_pages` lists the pages that could not be
+    partitioned when failed chunks are recovered, these formats cannot report them so they are
+    only logged then.
+    """
+    # Clean up returned elements
+    # Note(austin): pydantic should control this sort of thing for us
+    element_metrics = (
+        metrics
+        if metadata_fields is None
+        else [metric for metric in metrics if f"{metric}_count" in metadata_fields]
+    )
+    # -- the columnar formats have no response metadata, so they only need the counts the elements
+    # -- keep
+    has_totals = response_type != "text/csv" and response_type not in ARROW_FORMATS
+    count_stats = CountTextStats(
+        metrics if has_totals else element_metrics,
+        tokenizer,
+        num_threads=int(
+            os.environ.get("UNSTRUCTURED_TOKENIZER_THREADS", min(8, os.cpu_count() or 1))
+        ),
+        cache=get_text_stats_cache(),
+        element_metrics=element_metrics,
+    )
+    stages: List[ElementStage] = [
+        drop_empty_elements,
+        partial(
+            clean_text,
+            cleanup=partial(
+                pipeline_cleanup,
+                delete_emails=delete_emails,
+                delete_credit_cards=delete_credit_cards,
+                delete_phone_numbers=delete_phone_numbers,
+                clean_bullet_points=clean_bullet_points,
+                clean_numbered_list=clean_numbered_list,
+                clean_dashes=clean_dashes,
+                clean_whitespaces=clean_whitespaces,
+            ),
+        ),
+        partial(strip_metadata, filename=filename, coordinates=coordinates),
+    ]
+    if count_stats.metrics:
+        stages.append(count_stats)
+    if metadata_fields is not None:
+        stages.append(partial(project_metadata, metadata_fields=metadata_fields))
+    final_elements = run_stages(elements, stages)
+
+    if response_type == "application/x-ndjson":
+        return _iter_ndjson_lines(final_elements, count_stats, failed_pages, fields)
+
+    if response_type == "text/csv" or response_type in ARROW_FORMATS:
+        if failed_pages:
+            logger.warning(f"{filename} is missing pages that failed to partition: {failed_pages}")
+        # -- the columnar formats keep the types of the columns --
+        frame = convert_to_dataframe(final_elements, set_dtypes=response_type in ARROW_FORMATS)
+        if fields is not None:
+            # -- the metadata is already projected, its columns are flattened into the frame --
+            dropped = [field for field in ELEMENT_FIELDS if field not in fields]
+            frame = frame.drop(columns=dropped, errors="ignore")
+        return frame
+
+    result = serialize_elements(final_elements, fields)
+
+    response_metadata = PartitionResponseMetadata(**count_stats.totals, failed_pages=failed_pages)
+
+    # -- the element dicts are built right above, validating them would only copy them --
+    return PartitionResponse.model_construct(documents=result, metadata=response_metadata)
+
+
+@contextmanager
+def _partition_errors_as_http(
+    file_content_type: Optional[str], hi_res_model_name: Optional[str]
+) -> Iterator[None]:
+    """Report the errors of partitioning a document as the HTTPException the client gets."""
+    try:
+        yield
     except OSError as e:
         if isinstance(e.args[0], str) and (
             "chipper-fast-fine-tuning is not a local folder" in e.args[0]
@@ -490,94 +1174,50 @@ def pipeline_api(
             detail=f"Unknown model type: {hi_res_model_name}",
         )
 
-    # Clean up returned elements
-    # Note(austin): pydantic should control this sort of thing for us
-
-    words_count = 0
-    sentences_count = 0
-    paragraphs_count = 0
-    tokens_count = 0
-    characters_count = 0
-
-    final_elements: list[Element] = []
-
-    for i, element in enumerate(elements):
-
-        # If the text of the element is empty or length is 0, we don't want to keep it
-        if not element.text or len(element.text) == 0:
-            elements.pop(i)
-            continue
-
-        elements[i].metadata.filename = os.path.basename(filename)
-
-        elements[i].text = pipeline_cleanup(
-            elements[i].text,
-            delete_emails=delete_emails,
-            delete_credit_cards=delete_credit_cards,
-            delete_phone_numbers=delete_phone_numbers,
-            clean_bullet_points=clean_bullet_points,
-            clean_numbered_list=clean_numbered_list,
-            clean_dashes=clean_dashes,
-            clean_whitespaces=clean_whitespaces,
-        )
-
-        if not coordinates and element.metadata.coordinates:
-            elements[i].metadata.coordinates = None
-
-        if element.metadata.last_modified:
-            elements[i].metadata.last_modified = None
-
-        if element.metadata.file_directory:
-            elements[i].metadata.file_directory = None
-
-        if element.metadata.detection_class_prob:
-            elements[i].metadata.detection_class_prob = None
 
-        if element.metadata.orig_elements:
-            elements[i].metadata.orig_elements = None
-
-        # Add word count to metadata
-        element_words_count = count_words(element.text)
-        elements[i].metadata.words_count = element_words_count
-        words_count += element_words_count
-
-        # Add sentence count to the metadata
-        element_sentence_count = count_sentences(element.text)
-        elements[i].metadata.sentences_count = element_sentence_count
-        sentences_count += element_sentence_count
-
-        # Add paragraph count to the metadata
-        element_paragraph_count = count_paragraphs(element.text)
-        elements[i].metadata.paragraphs_count = element_paragraph_count
-        paragraphs_count += element_paragraph_count
-
-        # Add the token count to the metadata
-        element_tokens_count = len(tokenizer.encode(element.text))
-        elements[i].metadata.tokens_count = element_tokens_count
-        tokens_count += element_tokens_count
-
-        # Add the characters count to the metadata
-        element_characters_count = count_characters(element.text)
-        elements[i].metadata.characters_count = element_characters_count
-        characters_count += element_characters_count
-
-        final_elements.append(elements[i])
-
-    if response_type == "text/csv":
-        df = convert_to_dataframe(final_elements)
-        return df.to_csv(index=False)
+def _iter_chunk_responses(
+    chunks: Iterator[Tuple[List[Element], Optional[List[int]]]],
+    build_response: Callable[..., Any],
+    file_content_type: Optional[str],
+    hi_res_model_name: Optional[str],
+) -> Iterator[Any]:
+    """Build the response of every chunk of pages as it is partitioned, for `stream_pdf_pages`."""
+    with _partition_errors_as_http(file_content_type, hi_res_model_name):
+        for elements, failed_pages in chunks:
+            yield build_response(elements, failed_pages=failed_pages)
+
+
+def _iter_ndjson_lines(
+    elements: Iterator[Element],
+    count_stats: CountTextStats,
+    failed_pages: Optional[List[int]],
+    fields: Optional[Sequence[str]] = None,
+) -> Iterator[str]:
+    """Yield a json line for every element as it leaves post-processing, then the metadata line.
+
+    The last line is `{"metadata": ...}` with the counts of the whole document, which are only
+    known once every element went through.
+    """
+    for element in elements:
+        yield _dump_json(element_to_dict(element, fields)) + "\n"
+    metadata = PartitionResponseMetadata(**count_stats.totals, failed_pages=failed_pages)
+    yield _dump_json({"metadata": metadata.model_dump()}) + "\n"
 
-    result = convert_to_isd(final_elements)
 
-    response_metadata = PartitionResponseMetadata(
-        paragraphs_count=paragraphs_count,
-        characters_count=characters_count,
-        tokens_count=tokens_count,
-        sentences_count=sentences_count,
-        words_count=words_count,
-    )
+def iter_joined_csv(frames: Sequence[pd.DataFrame]) -> Iterator[str]:
+    """Write the csv of several files as one table, a file at a time, in upload order.
 
-    return PartitionResponse(documents=result, metadata=response_metadata)
+    The columns are the union of the columns of every file, in order of first appearance, and
+    the rows of a file leave the columns it does not have empty. The first column is the index of
+    the row in the whole table.
+    """
+    columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+    offset = 0
+    for file_index, frame in enumerate(frames):
+        frame = frame.reindex(columns=columns)
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        offset += len(frame)
+        yield frame.to_csv(header=file_index == 0)
 
 
 def _check_free_memory():
@@ -619,6 +1259,67 @@ def _validate_strategy(strategy: str) -> str:
     return strategy
 
 
+def _validate_metrics(metrics: Optional[List[str]]) -> Tuple[str, ...]:
+    """Return the requested counters in `TEXT_METRICS` order, all of them when none is given.
+
+    Names can also be given comma separated, and `none` turns every counter off.
+    """
+    if metrics is None:
+        return TEXT_METRICS
+
+    requested = {
+        name.strip().lower() for value in metrics for name in value.split(",") if name.strip()
+    }
+    if requested == {"none"}:
+        return ()
+
+    invalid = requested - set(TEXT_METRICS)
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Invalid metrics: {', '.join(sorted(invalid))}. Must be any of "
+                f"{list(TEXT_METRICS)}, or none"
+            ),
+        )
+    return tuple(metric for metric in TEXT_METRICS if metric in requested)
+
+
+def _validate_fields(
+    fields: Optional[List[str]], metadata_fields: Optional[List[str]]
+) -> Tuple[Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]:
+    """Return the element keys and metadata fields to keep in the response, None for all of them.
+
+    Names can also be given comma separated. `fields` must be keys of `ELEMENT_FIELDS`, any
+    metadata field can be asked for. Asking for `metadata_fields` keeps the metadata even when it
+    is not in `fields`, and leaving `metadata` out of `fields` drops all of it otherwise.
+    """
+
+    def split_names(values: List[str]) -> Tuple[str, ...]:
+        names = (name.strip() for value in values for name in value.split(","))
+        return tuple(dict.fromkeys(name for name in names if name))
+
+    requested_metadata = None if metadata_fields is None else split_names(metadata_fields)
+    if fields is None:
+        return None, requested_metadata
+
+    requested = split_names(fields)
+    invalid = set(requested) - set(ELEMENT_FIELDS)
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Invalid fields: {', '.join(sorted(invalid))}. Must be any of "
+                f"{list(ELEMENT_FIELDS)}"
+            ),
+        )
+    if requested_metadata is not None:
+        return tuple(dict.fromkeys([*requested, "metadata"])), requested_metadata
+    if "metadata" not in requested:
+        return requested, ()
+    return requested, None
+
+
 def _validate_chunking_strategy(chunking_strategy: Optional[str]) -> Optional[str]:
     """Raise on `chunking_strategy` is not a valid chunking strategy name.
 
@@ -652,12 +1353,34 @@ def _set_pdf_infer_table_structure(
     return strategy in ("hi_res", "auto") and pdf_infer_table_structure
 
 
+class MultipartPart(NamedTuple):
+    """A chunk of a `MultipartMixedResponse` with a content type of its own, like an error."""
+
+    body: str | bytes
+    content_type: str
+
+
 class MultipartMixedResponse(StreamingResponse):
+    """Send every chunk of the body iterator as a part of a multipart/mixed response.
+
+    Parts are base64 encoded, unless `binary` is set, in which case they are sent as they are
+    with `Content-Transfer-Encoding: binary`, the part headers and the body in separate messages,
+    so the body is never copied. Every part has the `content_type` of the response, unless the
+    chunk is a `MultipartPart`.
+    """
+
     CRLF = b"\r\n"
 
-    def __init__(self, *args: Any, content_type: Optional[str] = None, **kwargs: Any):
+    def __init__(
+        self,
+        *args: Any,
+        content_type: Optional[str] = None,
+        binary: bool = False,
+        **kwargs: Any,
+    ):
         super().__init__(*args, **kwargs)
         self.content_type = content_type
+        self.binary = binary
 
     def init_headers(self, headers: Optional[Mapping[str, str]] = None) -> None:
         super().init_headers(headers)
@@ -670,19 +1393,23 @@ class MultipartMixedResponse(StreamingResponse):
         return b"--" + self.boundary_value.encode()
 
     def _build_part_headers(self, headers: Dict[str, Any]) -> bytes:
-        header_bytes = b""
-        for header, value in headers.items():
-            header_bytes += f"{header}: {value}".encode() + self.CRLF
-        return header_bytes
-
-    def build_part(self, chunk: bytes) -> bytes:
-        part = self.boundary + self.CRLF
-        part_headers = {"Content-Length": len(chunk), "Content-Transfer-Encoding": "base64"}
-        if self.content_type is not None:
-            part_headers["Content-Type"] = self.content_type
-        part += self._build_part_headers(part_headers)
-        part += self.CRLF + chunk + self.CRLF
-        return part
+        return b"".join(f"{header}: {value}\r\n".encode() for header, value in headers.items())
+
+    def build_part_head(self, content_length: int, content_type: Optional[str] = None) -> bytes:
+        """The boundary and headers of a part, up to the blank line before its body."""
+        part_headers = {
+            "Content-Length": content_length,
+            "Content-Transfer-Encoding": "binary" if self.binary else "base64",
+        }
+        content_type = content_type or self.content_type
+        if content_type is not None:
+            part_headers["Content-Type"] = content_type
+        return b"".join(
+            [self.boundary, self.CRLF, self._build_part_headers(part_headers), self.CRLF]
+        )
+
+    def build_part(self, chunk: bytes, content_type: Optional[str] = None) -> bytes:
+        return b"".join([self.build_part_head(len(chunk), content_type), chunk, self.CRLF])
 
     async def stream_response(self, send: Send) -> None:
         await send(
@@ -692,15 +1419,73 @@ class MultipartMixedResponse(StreamingResponse):
                 "headers": self.raw_headers,
             }
         )
+        # -- in binary mode, the line break that ends a part goes out with what comes after it --
+        part_end = b""
         async for chunk in self.body_iterator:
+            content_type = None
+            if isinstance(chunk, MultipartPart):
+                chunk, content_type = chunk
             if not isinstance(chunk, bytes):
                 chunk = chunk.encode(self.charset)  # type: ignore
-                chunk = b64encode(chunk)
-            await send(
-                {"type": "http.response.body", "body": self.build_part(chunk), "more_body": True}
-            )
+            if not self.binary:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": self.build_part(b64encode(chunk), content_type),
+                        "more_body": True,
+                    }
+                )
+                continue
 
-        await send({"type": "http.response.body", "body": b"", "more_body": False})
+            head = part_end + self.build_part_head(len(chunk), content_type)
+            await send({"type": "http.response.body", "body": head, "more_body": True})
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            part_end = self.CRLF
+
+        await send({"type": "http.response.body", "body": part_end, "more_body": False})
+
+
+def _to_json_compatible(obj: Any) -> Any:
+    if isinstance(obj, PartitionResponse):
+        return {"documents": obj.documents, "metadata": obj.metadata.model_dump()}
+    return jsonable_encoder(obj)
+
+
+def _dump_json(content: Any) -> str:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_to_json_compatible,
+    )
+
+
+class PartitionJSONResponse(JSONResponse):
+    """Write partition responses straight to json bytes.
+
+    The default response of FastAPI first converts the whole content with `jsonable_encoder`,
+    another walk over every element dict. Here the element dicts go straight to the json encoder,
+    and only what it cannot encode by itself goes through `jsonable_encoder`. The bytes are the
+    same as those of the default response.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return _dump_json(content).encode("utf-8")
+
+
+def _serialize_multipart_part(response: Any, output_format: str) -> str | bytes:
+    """Serialize one partitioned document, or chunk of pages, as the body of a multipart part."""
+    if isinstance(response, PartitionResponse):
+        return response.model_dump_json()
+    if isinstance(response, pd.DataFrame) and output_format in ARROW_FORMATS:
+        return b"".join(iter_arrow_output([response], output_format))
+    if isinstance(response, pd.DataFrame):
+        return response.to_csv(index=False)
+    if isinstance(response, Iterator):
+        return "".join(cast(Iterator[str], response))
+    return response if type(response) in [str, bytes] else json.dumps(response)
 
 
 def ungz_file(file: UploadFile, gz_uncompressed_content_type: Optional[str] = None) -> UploadFile:
@@ -772,7 +1557,9 @@ def general_partition(
             "*/*",
             "multipart/mixed",
             "application/json",
+            "application/x-ndjson",
             "text/csv",
+            *ARROW_FORMATS,
         ]
     ):
         raise HTTPException(
@@ -781,6 +1568,7 @@ def general_partition(
         )
 
     # -- validate other arguments --
+    check_arrow_available(form_params.output_format)
     chunking_strategy = _validate_chunking_strategy(form_params.chunking_strategy)
 
     # -- unzip any uploaded files that need it --
@@ -790,92 +1578,148 @@ def general_partition(
         if is_content_type_gz or is_extension_gz:
             files[idx] = ungz_file(file, form_params.gz_uncompressed_content_type)
 
-    def response_generator(is_multipart: bool):
-        for file in files:
-            file_content_type = get_validated_mimetype(
-                file, content_type_hint=form_params.content_type
-            )
-
-            _file = file.file
+    def partition_uploaded_file(file: UploadFile):
+        file_content_type = get_validated_mimetype(file, content_type_hint=form_params.content_type)
+
+        _file = file.file
+
+        return pipeline_api(
+            _file,
+            request=request,
+            coordinates=form_params.coordinates,
+            encoding=form_params.encoding,
+            hi_res_model_name=form_params.hi_res_model_name,
+            include_page_breaks=form_params.include_page_breaks,
+            ocr_languages=form_params.ocr_languages,
+            pdf_infer_table_structure=form_params.pdf_infer_table_structure,
+            skip_infer_table_types=form_params.skip_infer_table_types,
+            strategy=form_params.strategy,
+            xml_keep_tags=form_params.xml_keep_tags,
+            response_type=form_params.output_format,
+            filename=str(file.filename) if file.filename else "",
+            file_content_type=file_content_type,
+            languages=form_params.languages,
+            extract_image_block_types=form_params.extract_image_block_types,
+            unique_element_ids=form_params.unique_element_ids,
+            # -- chunking options --
+            chunking_strategy=chunking_strategy,
+            combine_under_n_chars=form_params.combine_under_n_chars,
+            max_characters=form_params.max_characters,
+            multipage_sections=form_params.multipage_sections,
+            new_after_n_chars=form_params.new_after_n_chars,
+            overlap=form_params.overlap,
+            overlap_all=form_params.overlap_all,
+            starting_page_number=form_params.starting_page_number,
+            delete_emails=form_params.delete_emails,
+            delete_credit_cards=form_params.delete_credit_cards,
+            delete_phone_numbers=form_params.delete_phone_numbers,
+            clean_bullet_points=form_params.clean_bullet_points,
+            clean_numbered_list=form_params.clean_numbered_list,
+            clean_dashes=form_params.clean_dashes,
+            clean_whitespaces=form_params.clean_whitespaces,
+            include_slide_notes=form_params.include_slide_notes,
+            stream_pdf_pages=form_params.stream_pdf_pages,
+            metrics=form_params.metrics,
+            fields=form_params.fields,
+            metadata_fields=form_params.metadata_fields,
+        )
 
-            response = pipeline_api(
-                _file,
-                request=request,
-                coordinates=form_params.coordinates,
-                encoding=form_params.encoding,
-                hi_res_model_name=form_params.hi_res_model_name,
-                include_page_breaks=form_params.include_page_breaks,
-                ocr_languages=form_params.ocr_languages,
-                pdf_infer_table_structure=form_params.pdf_infer_table_structure,
-                skip_infer_table_types=form_params.skip_infer_table_types,
-                strategy=form_params.strategy,
-                xml_keep_tags=form_params.xml_keep_tags,
-                response_type=form_params.output_format,
-                filename=str(file.filename) if file.filename else "",
-                file_content_type=file_content_type,
-                languages=form_params.languages,
-                extract_image_block_types=form_params.extract_image_block_types,
-                unique_element_ids=form_params.unique_element_ids,
-                # -- chunking options --
-                chunking_strategy=chunking_strategy,
-                combine_under_n_chars=form_params.combine_under_n_chars,
-                max_characters=form_params.max_characters,
-                multipage_sections=form_params.multipage_sections,
-                new_after_n_chars=form_params.new_after_n_chars,
-                overlap=form_params.overlap,
-                overlap_all=form_params.overlap_all,
-                starting_page_number=form_params.starting_page_number,
-                delete_emails=form_params.delete_emails,
-                delete_credit_cards=form_params.delete_credit_cards,
-                delete_phone_numbers=form_params.delete_phone_numbers,
-                clean_bullet_points=form_params.clean_bullet_points,
-                clean_numbered_list=form_params.clean_numbered_list,
-                clean_dashes=form_params.clean_dashes,
-                clean_whitespaces=form_params.clean_whitespaces,
-                include_slide_notes=form_params.include_slide_notes,
-            )
+    def partition_uploaded_files():
+        executor = get_multi_file_executor()
+        if executor is None or len(files) <= 1:
+            yield from map(partition_uploaded_file, files)
+            return
+
+        # -- a request keeps at most a pool's worth of files queued, so the files of concurrent
+        # -- requests take turns on the shared pool; results are taken in upload order
+        window = _multi_file_thread_count
+        remaining = iter(files)
+        pending: Deque[Future[Any]] = deque(
+            executor.submit(partition_uploaded_file, file)
+            for file in itertools.islice(remaining, window)
+        )
+        try:
+            while pending:
+                result = pending.popleft().result()
+                if (file := next(remaining, None)) is not None:
+                    pending.append(executor.submit(partition_uploaded_file, file))
+                yield result
+        finally:
+            # -- don't start files that are still queued when the client or a file errors out --
+            for future in pending:
+                future.cancel()
 
+    def response_generator(is_multipart: bool):
+        for response in partition_uploaded_files():
             yield (
-                json.dumps(response)
-                if is_multipart and type(response) not in [str, bytes]
-                else (
-                    PlainTextResponse(response)
-                    if not is_multipart and form_params.output_format == "text/csv"
-                    else response
-                )
+                _serialize_multipart_part(response, form_params.output_format)
+                if is_multipart
+                else response
             )
 
+    def page_stream_generator(responses: List[Iterator[Any]]):
+        for response in responses:
+            try:
+                for part in response:
+                    yield _serialize_multipart_part(part, form_params.output_format)
+            except HTTPException as e:
+                # -- the status was already sent, so the error ends the response as its last part --
+                logger.error(f"Streaming a document failed: {e.detail}")
+                error = {"detail": e.detail, "status_code": e.status_code}
+                yield MultipartPart(_dump_json(error), "application/json")
+                return
+
     def join_responses(
-        responses: Sequence[str | List[Dict[str, Any]] | PlainTextResponse]
-    ) -> List[str | List[Dict[str, Any]]] | PlainTextResponse:
+        responses: Sequence[PartitionResponse | pd.DataFrame | Iterator[str]],
+    ) -> PartitionJSONResponse | StreamingResponse:
         """Consolidate partitionings from multiple documents into single response payload."""
+        if form_params.output_format == "application/x-ndjson":
+            # -- the lines of every document, each ending with its own metadata line --
+            return StreamingResponse(
+                itertools.chain.from_iterable(cast(Sequence[Iterator[str]], responses)),
+                media_type="application/x-ndjson",
+            )
+        if form_params.output_format in ARROW_FORMATS:
+            frames = cast(Sequence[pd.DataFrame], responses)
+            return StreamingResponse(
+                iter_arrow_output(frames, form_params.output_format),
+                media_type=form_params.output_format,
+            )
         if form_params.output_format != "text/csv":
-            return cast(List[Union[str, List[Dict[str, Any]]]], responses)
-        responses = cast(List[PlainTextResponse], responses)
-        data = pd.read_csv(  # pyright: ignore[reportUnknownMemberType]
-            io.BytesIO(responses[0].body)
-        )
-        if len(responses) > 1:
-            for resp in responses[1:]:
-                resp_data = pd.read_csv(  # pyright: ignore[reportUnknownMemberType]
-                    io.BytesIO(resp.body)
-                )
-                data = data.merge(  # pyright: ignore[reportUnknownMemberType]
-                    resp_data, how="outer"
-                )
-        return PlainTextResponse(data.to_csv())
+            return PartitionJSONResponse(responses)
+        return StreamingResponse(
+            iter_joined_csv(cast(Sequence[pd.DataFrame], responses)), media_type="text/plain"
+        )
 
-    return (
-        MultipartMixedResponse(
-            response_generator(is_multipart=True), content_type=form_params.output_format
+    if form_params.stream_pdf_pages:
+        # -- every file is validated before the response starts, parallel mode pdfs come back as
+        # -- lazy iterators of page chunks that are partitioned while the parts are being sent
+        return MultipartMixedResponse(
+            page_stream_generator(list(partition_uploaded_files())),
+            content_type=form_params.output_format,
+            binary=form_params.binary_parts,
+        )
+
+    if accept_type == "multipart/mixed":
+        return MultipartMixedResponse(
+            response_generator(is_multipart=True),
+            content_type=form_params.output_format,
+            binary=form_params.binary_parts,
         )
-        if accept_type == "multipart/mixed"
-        else (
-            list(response_generator(is_multipart=False))[0]
-            if len(files) == 1
-            else join_responses(list(response_generator(is_multipart=False)))
+    if len(files) > 1:
+        return join_responses(list(response_generator(is_multipart=False)))
+
+    response = list(response_generator(is_multipart=False))[0]
+    if form_params.output_format == "application/x-ndjson":
+        return StreamingResponse(response, media_type="application/x-ndjson")
+    if form_params.output_format == "text/csv":
+        return PlainTextResponse(response.to_csv(index=False))
+    if form_params.output_format in ARROW_FORMATS:
+        return StreamingResponse(
+            iter_arrow_output([response], form_params.output_format),
+            media_type=form_params.output_format,
         )
-    )
+    return PartitionJSONResponse(response)
 
 
 app.include_router(router)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from threading import Lock
+from typing import Dict
+
+
+class Counter:
+    """Monotonic counter that can be incremented from any thread."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+_counters: Dict[str, Counter] = {}
+_counters_lock = Lock()
+
+
+def get_counter(name: str, description: str) -> Counter:
+    """Return the process-wide counter called `name`, creating it on first use."""
+    with _counters_lock:
+        if name not in _counters:
+            _counters[name] = Counter(name, description)
+        return _counters[name]
+
+
+def render_metrics() -> str:
+    """Render every counter in the Prometheus text exposition format."""
+    lines = []
+    with _counters_lock:
+        counters = sorted(_counters.values(), key=lambda counter: counter.name)
+    for counter in counters:
+        lines.append(f"# HELP {counter.name} {counter.description}")
+        lines.append(f"# TYPE {counter.name} counter")
+        lines.append(f"{counter.name} {counter.value}")
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,7 @@
-from typing import Annotated, List, Literal, Optional
+from typing import Annotated, Any, Dict, List, Literal, Optional
 
 from fastapi import Form
-from pydantic import BaseModel, BeforeValidator
+from pydantic import BaseModel, BeforeValidator, SerializerFunctionWrapHandler, model_serializer
 
 from prepline_general.api.utils import SmartValueParser
 
@@ -44,6 +44,11 @@ class GeneralFormParams(BaseModel):
     clean_dashes: bool
     clean_whitespaces: bool
     include_slide_notes: bool
+    stream_pdf_pages: bool = False
+    metrics: Optional[List[str]] = None
+    binary_parts: bool = False
+    fields: Optional[List[str]] = None
+    metadata_fields: Optional[List[str]] = None
 
     @classmethod
     def as_form(
@@ -94,10 +99,16 @@ class GeneralFormParams(BaseModel):
             ),
         ] = None,
         output_format: Annotated[
-            Literal["application/json", "text/csv"],
+            Literal[
+                "application/json",
+                "application/x-ndjson",
+                "text/csv",
+                "application/vnd.apache.arrow.stream",
+                "application/vnd.apache.parquet",
+            ],
             Form(
                 title="Output Format",
-                description="The format of the response. Supported formats are application/json and text/csv. Default: application/json.",
+                description="The format of the response. Supported formats are application/json, application/x-ndjson, text/csv, application/vnd.apache.arrow.stream and application/vnd.apache.parquet. Default: application/json.",
                 example="application/json",
             ),
         ] = "application/json",
@@ -314,6 +325,71 @@ level of "pollution" of otherwise clean semantic chunk boundaries. Default: Fals
                 example=False,
             ),
         ] = True,
+        stream_pdf_pages: Annotated[
+            bool,
+            Form(
+                title="Stream PDF Pages",
+                description=(
+                    "When `True`, the response is sent as multipart/mixed with one part per"
+                    " document. In parallel mode, pdfs get one part per chunk of pages instead,"
+                    " sent in page order as soon as each chunk is partitioned. Default: `False`"
+                ),
+                example=True,
+            ),
+            BeforeValidator(SmartValueParser[bool]().value_or_first_element),
+        ] = False,
+        metrics: Annotated[
+            List[str],
+            Form(
+                title="Metrics",
+                description=(
+                    "The counters to compute for every element and the whole document, any of"
+                    " words, sentences, paragraphs, tokens and characters, or none. Counters"
+                    " that are not asked for are left out of the element metadata and are null"
+                    " in the response metadata. Default: all of them"
+                ),
+                example="[words, characters]",
+            ),
+            BeforeValidator(SmartValueParser[List[str]]().value_or_first_element),
+        ] = [],  # noqa
+        binary_parts: Annotated[
+            bool,
+            Form(
+                title="Binary Parts",
+                description=(
+                    "When `True`, the parts of a multipart/mixed response are sent as they are,"
+                    " with `Content-Transfer-Encoding: binary`, instead of base64 encoded."
+                    " Default: `False`"
+                ),
+                example=True,
+            ),
+            BeforeValidator(SmartValueParser[bool]().value_or_first_element),
+        ] = False,
+        fields: Annotated[
+            List[str],
+            Form(
+                title="Fields",
+                description=(
+                    "The keys to return for every element, any of type, element_id, text,"
+                    " metadata and embeddings. Default: all of them"
+                ),
+                example="[type, text, metadata]",
+            ),
+            BeforeValidator(SmartValueParser[List[str]]().value_or_first_element),
+        ] = [],  # noqa
+        metadata_fields: Annotated[
+            List[str],
+            Form(
+                title="Metadata Fields",
+                description=(
+                    "The metadata fields to return for every element, like page_number or"
+                    " filename. Fields that are not asked for are never serialized. Default: all"
+                    " of them"
+                ),
+                example="[page_number]",
+            ),
+            BeforeValidator(SmartValueParser[List[str]]().value_or_first_element),
+        ] = [],  # noqa
     ) -> "GeneralFormParams":
         return cls(
             xml_keep_tags=xml_keep_tags,
@@ -349,15 +425,31 @@ level of "pollution" of otherwise clean semantic chunk boundaries. Default: Fals
             clean_dashes=clean_dashes,
             clean_whitespaces=clean_whitespaces,
             include_slide_notes=include_slide_notes,
+            stream_pdf_pages=stream_pdf_pages,
+            metrics=metrics if metrics else None,
+            binary_parts=binary_parts,
+            fields=fields if fields else None,
+            metadata_fields=metadata_fields if metadata_fields else None,
         )
 
 
 class PartitionResponseMetadata(BaseModel):
-    words_count: int
-    characters_count: int
-    sentences_count: int
-    paragraphs_count: int
-    tokens_count: int
+    # -- counters left out of the `metrics` parameter are not computed --
+    words_count: Optional[int] = None
+    characters_count: Optional[int] = None
+    sentences_count: Optional[int] = None
+    paragraphs_count: Optional[int] = None
+    tokens_count: Optional[int] = None
+    # -- pages left out of a parallel mode pdf because they could not be partitioned, only set
+    # -- when `UNSTRUCTURED_PARALLEL_MODE_PARTIAL_RESULTS` recovers failed splits
+    failed_pages: Optional[List[int]] = None
+
+    @model_serializer(mode="wrap")
+    def _omit_unset_failed_pages(self, handler: SerializerFunctionWrapHandler) -> Dict[str, Any]:
+        data = handler(self)
+        if self.failed_pages is None:
+            del data["failed_pages"]
+        return data
 
 
 class PartitionResponse(BaseModel):
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from threading import Lock, Thread
+from typing import Any, Awaitable, Callable, Coroutine, Deque, Iterable, Iterator, Optional, TypeVar
+
+import httpx
+
+from prepline_general.api.backend_pool import BackendPool
+from prepline_general.api.metrics import get_counter
+
+logger = logging.getLogger("unstructured_api")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+hedges_issued = get_counter(
+    "unstructured_parallel_mode_hedges_issued_total",
+    "Duplicate sub-requests sent because a page split ran past the hedge latency.",
+)
+hedges_won = get_counter(
+    "unstructured_parallel_mode_hedges_won_total",
+    "Duplicate sub-requests that answered before the split they duplicated.",
+)
+
+
+class ParallelModeDispatcher:
+    """Node-wide event loop that drives the sub-requests of parallel mode.
+
+    All in-flight documents share one `httpx.AsyncClient` with a keep-alive connection pool, and one
+    semaphore that bounds the number of sub-requests this node has outstanding at any time. The
+    loop runs in a daemon thread, so the synchronous partition endpoint can hand it coroutines.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        pool_size: int,
+        keepalive: bool = True,
+        connect_timeout: float = 10,
+        read_timeout: Optional[float] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+        backends: Optional[BackendPool] = None,
+        healthcheck_interval: float = 0,
+    ):
+        self.concurrency = concurrency
+        self.backends = backends or BackendPool()
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(
+            target=self._loop.run_forever, name="parallel-mode-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+        async def setup() -> None:
+            self.semaphore = asyncio.Semaphore(concurrency)
+            self.client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size if keepalive else 0,
+                ),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+            if healthcheck_interval > 0:
+                self._health_checks = asyncio.ensure_future(
+                    self._check_health_every(healthcheck_interval)
+                )
+
+        self.run(setup())
+
+    async def _check_health_every(self, interval: float) -> None:
+        while True:
+            try:
+                await self.backends.check_health(self.client)
+            except Exception as e:
+                # -- e.g. a missing discovery file, which the sub-requests will report --
+                logger.warning(f"Parallel mode backend health check failed: {e!r}")
+            await asyncio.sleep(interval)
+
+    def run(self, coro: Coroutine[Any, Any, R]) -> R:
+        """Run `coro` on the dispatcher loop and block until it returns."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None while hedging is off or still warming up.
+
+        This is the `hedge_percentile` of the most recent call latencies.
+        """
+        if self.hedge_percentile is None or len(self._latencies) < self.hedge_min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[round(self.hedge_percentile / 100 * (len(latencies) - 1))]
+
+    async def hedge(self, send: Callable[[bool], Awaitable[R]]) -> R:
+        """Await `send(False)`, racing it against a duplicate `send(True)` if it is a straggler.
+
+        Once the call has run past `hedge_delay`, the duplicate is sent and whichever succeeds first
+        is returned, the other one is cancelled. A failure only counts when both calls fail.
+        """
+        delay = self.hedge_delay()
+        start = time.monotonic()
+        primary = asyncio.ensure_future(send(False))
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    hedges_issued.inc()
+                    return await self._race(primary, asyncio.ensure_future(send(True)), start)
+
+            result = await primary
+            self._latencies.append(time.monotonic() - start)
+            return result
+        finally:
+            # -- the document was cancelled while the call was in flight --
+            primary.cancel()
+
+    async def _race(
+        self, primary: asyncio.Future[R], duplicate: asyncio.Future[R], start: float
+    ) -> R:
+        pending = {primary, duplicate}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is duplicate:
+                            hedges_won.inc()
+                        self._latencies.append(time.monotonic() - start)
+                        return future.result()
+            # -- both calls failed, report the error of the original one --
+            return primary.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def map_in_order(
+        self,
+        func: Callable[[T], Awaitable[R]],
+        items: Iterable[T],
+        window: Optional[int] = None,
+    ) -> Iterator[R]:
+        """Yield `func(item)` for every item, in order, as soon as each result is available.
+
+        Items are pulled from `items` lazily: no more than `window` of them (the node concurrency by
+        default) are scheduled ahead of the result the caller is waiting on. If the caller stops
+        early or a call fails, the calls still pending are cancelled.
+        """
+        window = window or self.concurrency
+        pending: Deque[Any] = deque()
+
+        async def call(item: T) -> R:
+            return await func(item)
+
+        try:
+            for item in items:
+                pending.append(asyncio.run_coroutine_threadsafe(call(item), self._loop))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self) -> None:
+        if health_checks := getattr(self, "_health_checks", None):
+            self._loop.call_soon_threadsafe(health_checks.cancel)
+        self.run(self.client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_dispatcher: Optional[ParallelModeDispatcher] = None
+_dispatcher_lock = Lock()
+
+
+def get_parallel_mode_dispatcher() -> ParallelModeDispatcher:
+    """Return the process-wide dispatcher, configured from the `UNSTRUCTURED_PARALLEL_MODE_*` env.
+
+    `UNSTRUCTURED_PARALLEL_MODE_CONCURRENCY` bounds the sub-requests in flight on this node across
+    all documents, and defaults to `UNSTRUCTURED_PARALLEL_MODE_THREADS`.
+    """
+    global _dispatcher
+
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            concurrency = int(
+                os.environ.get(
+                    "UNSTRUCTURED_PARALLEL_MODE_CONCURRENCY",
+                    os.environ.get("UNSTRUCTURED_PARALLEL_MODE_THREADS", 3),
+                )
+            )
+            read_timeout = os.environ.get("UNSTRUCTURED_PARALLEL_MODE_READ_TIMEOUT")
+            hedge_percentile = os.environ.get("UNSTRUCTURED_PARALLEL_MODE_HEDGE_PERCENTILE")
+            _dispatcher = ParallelModeDispatcher(
+                concurrency=concurrency,
+                pool_size=int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_POOL_SIZE", concurrency)),
+                keepalive=os.environ.get("UNSTRUCTURED_PARALLEL_MODE_KEEPALIVE", "true") == "true",
+                connect_timeout=float(
+                    os.environ.get("UNSTRUCTURED_PARALLEL_MODE_CONNECT_TIMEOUT", 10)
+                ),
+                read_timeout=float(read_timeout) if read_timeout else None,
+                hedge_percentile=float(hedge_percentile) if hedge_percentile else None,
+                hedge_min_samples=int(
+                    os.environ.get("UNSTRUCTURED_PARALLEL_MODE_HEDGE_MIN_SAMPLES", 20)
+                ),
+                backends=BackendPool(
+                    failure_threshold=int(
+                        os.environ.get("UNSTRUCTURED_PARALLEL_MODE_BREAKER_FAILURES", 5)
+                    ),
+                    cooldown=float(
+                        os.environ.get("UNSTRUCTURED_PARALLEL_MODE_BREAKER_COOLDOWN", 30)
+                    ),
+                ),
+                healthcheck_interval=float(
+                    os.environ.get("UNSTRUCTURED_PARALLEL_MODE_HEALTHCHECK_INTERVAL", 10)
+                ),
+            )
+            logger.info(f"Started parallel mode dispatcher with concurrency {concurrency}")
+
+    return _dispatcher
+
+
+def shutdown_parallel_mode_dispatcher() -> None:
+    global _dispatcher
+
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.close()
+            _dispatcher = None
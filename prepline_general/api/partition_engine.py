@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import IO, Any, List, Optional
+
+from fastapi import HTTPException
+from unstructured.documents.elements import Element
+
+logger = logging.getLogger("unstructured_api")
+
+
+def _warm_worker() -> None:
+    """Import the partitioning stack and load the models once, when a worker process starts."""
+    import tiktoken
+    from unstructured.partition.auto import partition  # noqa: F401
+    from unstructured.partition.pdf import default_hi_res_model
+    from unstructured_inference.models.base import get_model
+
+    tiktoken.get_encoding("o200k_base")
+
+    try:
+        get_model(default_hi_res_model())
+    except Exception as e:
+        # -- a worker without a preloaded model still works, it just loads it on first use --
+        logger.warning(f"Partition engine worker could not preload the hi_res model: {e}")
+
+
+def _noop() -> None:
+    """Submitted once per worker so that every process is spawned and warmed up front."""
+
+
+def _partition_path(path: str, **partition_kwargs: Any) -> List[Element]:
+    """Partition the file at `path` inside a worker process."""
+    from unstructured.partition.auto import partition
+
+    with open(path, "rb") as file:
+        return partition(file=file, **partition_kwargs)
+
+
+class PartitionEngine:
+    """Pool of long-lived worker processes that run `partition` with preloaded models.
+
+    Files are handed to the workers as paths to temporary files, so the document bytes are never
+    pickled. A native crash in a partitioner only takes down a worker, after which the pool is
+    restarted and the request fails with a 500.
+    """
+
+    def __init__(self, max_workers: int, tmp_dir: Optional[str] = None):
+        self.max_workers = max_workers
+        self.tmp_dir = tmp_dir
+        self._lock = Lock()
+        self._executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        logger.info(f"Starting partition engine with {self.max_workers} workers")
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            # -- never fork a process that already runs uvicorn and its threads --
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        for _ in range(self.max_workers):
+            executor.submit(_noop)
+        return executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            # -- another thread may have restarted the pool already --
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+
+    def spool(self, file: IO[bytes]) -> str:
+        """Copy `file` to a temporary file the workers can open, and return its path."""
+        file.seek(0)
+        with tempfile.NamedTemporaryFile(delete=False, dir=self.tmp_dir) as tmp_file:
+            shutil.copyfileobj(file, tmp_file)
+        file.seek(0)
+        return tmp_file.name
+
+    def partition(self, file: IO[bytes], **partition_kwargs: Any) -> List[Element]:
+        """Drop-in replacement for `partition(file=file, **partition_kwargs)`."""
+        path = self.spool(file)
+        executor = self._executor
+        try:
+            return executor.submit(_partition_path, path, **partition_kwargs).result()
+        except BrokenProcessPool:
+            logger.error("Partition engine worker crashed, restarting the pool")
+            self._restart(executor)
+            raise HTTPException(
+                status_code=500,
+                detail="Partitioning worker crashed while processing the file.",
+            )
+        finally:
+            os.unlink(path)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_engine: Optional[PartitionEngine] = None
+_engine_lock = Lock()
+
+
+def _get_or_start_engine(max_workers: int) -> PartitionEngine:
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = PartitionEngine(
+                max_workers=max_workers,
+                tmp_dir=os.environ.get("UNSTRUCTURED_PARTITION_ENGINE_TMPDIR"),
+            )
+    return _engine
+
+
+def get_partition_engine() -> Optional[PartitionEngine]:
+    """Return the process-wide engine, or None when it is disabled.
+
+    The engine is enabled by setting `UNSTRUCTURED_PARTITION_ENGINE_WORKERS` to the number of worker
+    processes to run.
+    """
+    max_workers = int(os.environ.get("UNSTRUCTURED_PARTITION_ENGINE_WORKERS", 0))
+    if max_workers <= 0:
+        return None
+    return _get_or_start_engine(max_workers)
+
+
+def get_local_split_engine() -> PartitionEngine:
+    """Return the engine used to partition pdf splits on this node in local parallel mode.
+
+    This is the process-wide engine when it is enabled, otherwise an engine is started with
+    `UNSTRUCTURED_PARALLEL_MODE_THREADS` workers.
+    """
+    return get_partition_engine() or _get_or_start_engine(
+        int(os.environ.get("UNSTRUCTURED_PARALLEL_MODE_THREADS", 3))
+    )
+
+
+def shutdown_partition_engine() -> None:
+    global _engine
+
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown()
+            _engine = None
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import itertools
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import tiktoken
+from unstructured.documents.elements import Element
+
+from prepline_general.api.metrics import get_counter
+from prepline_general.api.utils import TextStats, count_text_stats
+
+text_stats_cache_hits = get_counter(
+    "unstructured_text_stats_cache_hits_total",
+    "Element texts whose counts were found in the text stats cache.",
+)
+text_stats_cache_misses = get_counter(
+    "unstructured_text_stats_cache_misses_total",
+    "Element texts that had to be counted because they were not in the text stats cache.",
+)
+
+# -- the keys of an element dict that `fields` can select --
+ELEMENT_FIELDS = ("type", "element_id", "text", "metadata", "embeddings")
+
+# -- a stage takes the elements of the previous one and yields them on, changed or filtered --
+ElementStage = Callable[[Iterable[Element]], Iterator[Element]]
+
+
+def run_stages(elements: Iterable[Element], stages: Sequence[ElementStage]) -> Iterator[Element]:
+    """Chain the stages into one lazy pipeline over the elements.
+
+    Nothing runs until the result is iterated, and then every element flows through all the stages
+    before the next one is pulled, so no stage builds a list of the elements.
+    """
+    return functools.reduce(lambda stream, stage: stage(stream), stages, iter(elements))
+
+
+def drop_empty_elements(elements: Iterable[Element]) -> Iterator[Element]:
+    """Leave out the elements without any text."""
+    return (element for element in elements if element.text)
+
+
+def clean_text(elements: Iterable[Element], cleanup: Callable[[str], str]) -> Iterator[Element]:
+    """Replace the text of every element by `cleanup(text)`."""
+    for element in elements:
+        element.text = cleanup(element.text)
+        yield element
+
+
+def strip_metadata(
+    elements: Iterable[Element], filename: str, coordinates: bool
+) -> Iterator[Element]:
+    """Report the bare filename, and drop the metadata that is not returned by the api."""
+    filename = os.path.basename(filename)
+    for element in elements:
+        metadata = element.metadata
+        metadata.filename = filename
+        if not coordinates:
+            metadata.coordinates = None
+        metadata.last_modified = None
+        metadata.file_directory = None
+        metadata.detection_class_prob = None
+        metadata.orig_elements = None
+        yield element
+
+
+def project_metadata(
+    elements: Iterable[Element], metadata_fields: Sequence[str]
+) -> Iterator[Element]:
+    """Drop the metadata fields that are not in `metadata_fields`, so they are never serialized."""
+    keep = set(metadata_fields)
+    for element in elements:
+        metadata = element.metadata
+        for name in [name for name in vars(metadata) if name not in keep]:
+            # -- the private attributes of the metadata are not fields --
+            if not name.startswith("_"):
+                delattr(metadata, name)
+        yield element
+
+
+class TextStatsCache:
+    """Bounded LRU cache of the counts of element texts, shared by the requests of a worker.
+
+    Running headers, footers and page numbers repeat on every page of a long document, so their
+    counts are looked up instead of tokenizing them again. Entries are keyed by a hash of the text,
+    which keeps the texts themselves out of the cache. The counts of a text are only as complete as
+    the `metrics` it was counted for, missing counters are counted and added on the next request
+    that asks for them. All the counts are assumed to come from the same tokenizer.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._stats: OrderedDict[bytes, TextStats] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def count(
+        self,
+        texts: Sequence[str],
+        tokenizer: tiktoken.Encoding,
+        metrics: Sequence[str],
+        batch_size: int = 1000,
+        num_threads: int = 8,
+    ) -> List[TextStats]:
+        """Return the counts of every text like `count_text_stats`, only counting the new texts.
+
+        A text that repeats within `texts` is counted once.
+        """
+        count_fields = [f"{metric}_count" for metric in metrics]
+        keys = [self._key(text) for text in texts]
+        found: Dict[bytes, TextStats] = {}
+        missing: Dict[bytes, str] = {}
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in found or key in missing:
+                    continue
+                stats = self._stats.get(key)
+                if stats is not None and all(getattr(stats, f) is not None for f in count_fields):
+                    self._stats.move_to_end(key)
+                    found[key] = stats
+                else:
+                    missing[key] = text
+
+        text_stats_cache_misses.inc(len(missing))
+        text_stats_cache_hits.inc(len(texts) - len(missing))
+        if missing:
+            counted = count_text_stats(
+                list(missing.values()),
+                tokenizer,
+                metrics=metrics,
+                batch_size=batch_size,
+                num_threads=num_threads,
+            )
+            with self._lock:
+                for key, stats in zip(missing, counted):
+                    if (cached := self._stats.get(key)) is not None:
+                        stats = cached._replace(**{f: getattr(stats, f) for f in count_fields})
+                    found[key] = self._stats[key] = stats
+                    self._stats.move_to_end(key)
+                while len(self._stats) > self.max_size:
+                    self._stats.popitem(last=False)
+
+        return [found[key] for key in keys]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_text_stats_cache: Optional[TextStatsCache] = None
+_text_stats_cache_lock = Lock()
+
+
+def get_text_stats_cache() -> Optional[TextStatsCache]:
+    """Return the process-wide text stats cache, None when it is turned off.
+
+    `UNSTRUCTURED_TEXT_STATS_CACHE_SIZE` bounds the number of texts it holds, `0` turns it off.
+    """
+    global _text_stats_cache
+
+    with _text_stats_cache_lock:
+        if _text_stats_cache is None:
+            max_size = int(os.environ.get("UNSTRUCTURED_TEXT_STATS_CACHE_SIZE", 50000))
+            if max_size <= 0:
+                return None
+            _text_stats_cache = TextStatsCache(max_size)
+        return _text_stats_cache
+
+
+class CountTextStats:
+    """Add the requested word, sentence, paragraph, token and character counts to the metadata.
+
+    The elements are counted in batches of `batch_size`, so the tokenizer still gets a batch to
+    spread over its threads, and the totals of the document are summed up in `totals` as the
+    elements go through. Only the counts of `element_metrics`, all of `metrics` when None, are
+    added to the metadata of the elements. With a `cache`, only the texts it does not know yet are
+    counted.
+    """
+
+    def __init__(
+        self,
+        metrics: Sequence[str],
+        tokenizer: tiktoken.Encoding,
+        batch_size: int = 1000,
+        num_threads: int = 8,
+        cache: Optional[TextStatsCache] = None,
+        element_metrics: Optional[Sequence[str]] = None,
+    ):
+        self.metrics = metrics
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.count = cache.count if cache is not None else count_text_stats
+        self.count_fields = [f"{metric}_count" for metric in metrics]
+        self.element_count_fields = [
+            f"{metric}_count"
+            for metric in (metrics if element_metrics is None else element_metrics)
+        ]
+        self.totals: Dict[str, int] = dict.fromkeys(self.count_fields, 0)
+
+    def __call__(self, elements: Iterable[Element]) -> Iterator[Element]:
+        elements = iter(elements)
+        while batch := list(itertools.islice(elements, self.batch_size)):
+            all_stats = self.count(
+                [element.text for element in batch],
+                self.tokenizer,
+                metrics=self.metrics,
+                batch_size=self.batch_size,
+                num_threads=self.num_threads,
+            )
+            for element, stats in zip(batch, all_stats):
+                for field in self.count_fields:
+                    self.totals[field] += getattr(stats, field)
+                for field in self.element_count_fields:
+                    setattr(element.metadata, field, getattr(stats, field))
+            yield from batch
+
+
+def element_to_dict(element: Element, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Convert the element to the dict returned by the api, with only the keys in `fields`."""
+    element_dict = element.to_dict()
+    if fields is None:
+        return element_dict
+    return {key: value for key, value in element_dict.items() if key in fields}
+
+
+def serialize_elements(
+    elements: Iterable[Element], fields: Optional[Sequence[str]] = None
+) -> List[Dict[str, Any]]:
+    """Convert the elements to the dicts returned in the json response, the end of the pipeline."""
+    return [element_to_dict(element, fields) for element in elements]
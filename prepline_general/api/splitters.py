@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import io
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+import openpyxl
+import pypdfium2 as pdfium  # type: ignore
+from PIL import Image
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+# -- pdfium is not thread-safe, so calls into it are serialized across requests --
+pdfium_lock = Lock()
+
+
+def get_pdf_splits(
+    pdf: pdfium.PdfDocument,
+    split_size: int = 1,
+    page_ranges: Optional[Sequence[Tuple[int, int]]] = None,
+) -> Iterator[Tuple[IO[bytes], int]]:
+    """Given a pdf (PdfDocument) with n pages, split it into pdfs each with split_size # of pages.
+
+    Pass `page_ranges` as [(start, end)] to split the pdf into ranges of different sizes instead.
+    Each split is only built when the caller asks for it. Pages are copied natively by pdfium, and
+    the split is handed on in the buffer it was saved to.
+
+    Return the files with their page offset in the form [(BytesIO, int)]
+    """
+    if page_ranges is None:
+        with pdfium_lock:
+            page_count = len(pdf)
+        page_ranges = [
+            (offset, min(offset + split_size, page_count))
+            for offset in range(0, page_count, split_size)
+        ]
+
+    for offset, end in page_ranges:
+        pdf_buffer = io.BytesIO()
+
+        with pdfium_lock:
+            new_pdf = pdfium.PdfDocument.new()
+            try:
+                new_pdf.import_pages(pdf, pages=list(range(offset, end)))
+                new_pdf.save(pdf_buffer)
+            finally:
+                new_pdf.close()
+
+        pdf_buffer.seek(0)
+        yield (pdf_buffer, offset)
+
+
+class DocumentSplitter(ABC):
+    """A document that parallel mode can split into ranges of its pages.
+
+    A page is whatever the partitioner of the format numbers as one: the pages of a pdf, the sheets
+    of a workbook, the slides of a presentation or the frames of a tiff. That way the
+    `starting_page_number` of each split, offset by the start of its range, numbers the elements
+    of the split as if the whole document had been partitioned at once.
+    """
+
+    # -- the format in the error reported when the file cannot be read, e.g. "PDF" --
+    format_name: str
+    page_count: int
+
+    @abstractmethod
+    def __init__(self, file: IO[bytes]):
+        """Open the document in `file` and count its pages."""
+
+    @abstractmethod
+    def get_splits(self, page_ranges: Sequence[Tuple[int, int]]) -> Iterator[Tuple[IO[bytes], int]]:
+        """Build a document of the same format for every range of pages [(start, end)].
+
+        Each split is only built when the caller asks for it. Return the files with their page
+        offset in the form [(BytesIO, int)]
+        """
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> DocumentSplitter:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class PdfSplitter(DocumentSplitter):
+    format_name = "PDF"
+
+    def __init__(self, file: IO[bytes]):
+        # -- pdfium reads the pages from the file itself, without copying it into memory --
+        with pdfium_lock:
+            self.pdf = pdfium.PdfDocument(file)
+            self.page_count = len(self.pdf)
+
+    def get_splits(self, page_ranges: Sequence[Tuple[int, int]]) -> Iterator[Tuple[IO[bytes], int]]:
+        return get_pdf_splits(self.pdf, page_ranges=page_ranges)
+
+    def close(self) -> None:
+        with pdfium_lock:
+            self.pdf.close()
+
+
+class XlsxSplitter(DocumentSplitter):
+    """Split a workbook by sheet.
+
+    Only the cell values are copied, which is all the xlsx partitioner reads. The source is
+    streamed in read-only mode and the splits are written in write-only mode, so a sheet is never
+    held in memory as a whole.
+    """
+
+    format_name = "xlsx"
+
+    def __init__(self, file: IO[bytes]):
+        self.workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        self.sheet_names: List[str] = self.workbook.sheetnames
+        self.page_count = len(self.sheet_names)
+
+    def get_splits(self, page_ranges: Sequence[Tuple[int, int]]) -> Iterator[Tuple[IO[bytes], int]]:
+        for offset, end in page_ranges:
+            new_workbook = openpyxl.Workbook(write_only=True)
+            for sheet_name in self.sheet_names[offset:end]:
+                new_sheet = new_workbook.create_sheet(sheet_name)
+                for row in self.workbook[sheet_name].iter_rows(values_only=True):
+                    new_sheet.append(row)
+
+            xlsx_buffer = io.BytesIO()
+            new_workbook.save(xlsx_buffer)
+            xlsx_buffer.seek(0)
+            yield (xlsx_buffer, offset)
+
+    def close(self) -> None:
+        self.workbook.close()
+
+
+class PptxSplitter(DocumentSplitter):
+    """Split a presentation by slide range.
+
+    The presentation is parsed once. Every split is saved from it with only the slides of its range
+    in the slide list, so the masters, layouts and notes of the slides it keeps come along. Parts no
+    longer referenced by any slide are left out when the split is saved.
+    """
+
+    format_name = "pptx"
+
+    def __init__(self, file: IO[bytes]):
+        self.presentation = Presentation(file)
+        self.slide_list = self.presentation.element.get_or_add_sldIdLst()
+        self.slides = [
+            (slide_id, self.presentation.part.related_part(slide_id.rId))
+            for slide_id in self.slide_list
+        ]
+        self.page_count = len(self.slides)
+
+    def get_splits(self, page_ranges: Sequence[Tuple[int, int]]) -> Iterator[Tuple[IO[bytes], int]]:
+        presentation_part = self.presentation.part
+        for offset, end in page_ranges:
+            # -- python-pptx has no api to remove a slide, so the slide list and its relationships
+            # -- are set to the slides of the range
+            for slide_id in list(self.slide_list):
+                self.slide_list.remove(slide_id)
+                presentation_part.drop_rel(slide_id.rId)
+            for slide_id, slide_part in self.slides[offset:end]:
+                slide_id.rId = presentation_part.relate_to(slide_part, RT.SLIDE)
+                self.slide_list.append(slide_id)
+
+            pptx_buffer = io.BytesIO()
+            self.presentation.save(pptx_buffer)
+            pptx_buffer.seek(0)
+            yield (pptx_buffer, offset)
+
+
+class TiffSplitter(DocumentSplitter):
+    """Split a multi-page tiff by frame."""
+
+    format_name = "tiff"
+
+    def __init__(self, file: IO[bytes]):
+        self.image = Image.open(file)
+        self.page_count = getattr(self.image, "n_frames", 1)
+
+    def get_splits(self, page_ranges: Sequence[Tuple[int, int]]) -> Iterator[Tuple[IO[bytes], int]]:
+        for offset, end in page_ranges:
+            frames = []
+            for index in range(offset, end):
+                self.image.seek(index)
+                frames.append(self.image.copy())
+
+            tiff_buffer = io.BytesIO()
+            frames[0].save(
+                tiff_buffer,
+                format="TIFF",
+                save_all=True,
+                append_images=frames[1:],
+                compression="tiff_deflate",
+                # -- OCR depends on the resolution, which is not copied along with the frames --
+                **({"dpi": self.image.info["dpi"]} if "dpi" in self.image.info else {}),
+            )
+            tiff_buffer.seek(0)
+            yield (tiff_buffer, offset)
+
+    def close(self) -> None:
+        self.image.close()
+
+
+DOCUMENT_SPLITTERS: Dict[str, Type[DocumentSplitter]] = {
+    "application/pdf": PdfSplitter,
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": XlsxSplitter,
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": PptxSplitter,
+    "image/tiff": TiffSplitter,
+}
@@ -1,7 +1,24 @@
+import functools
+import itertools
 import json
 import re
-from typing import TypeVar, Union, List, Generic, get_origin, get_args, Any, Tuple
-from unstructured.cleaners.extract import extract_email_address
+from typing import (
+    TypeVar,
+    Union,
+    List,
+    Generic,
+    get_origin,
+    get_args,
+    Any,
+    Collection,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import tiktoken
 
 T = TypeVar("T")
 E = TypeVar("E")
@@ -171,64 +188,148 @@ def count_paragraphs(s: str) -> int:
     return len(s.split("\n\n"))
 
 
-def extract_phone_numbers(text: str):
-    # Updated pattern to include international formats like +34672013593
-    pattern = r"\b(?:\+\d{1,3}[-.\s]?)?(?:\(\d{1,4}\)|\d{1,4})[-.\s]?\d{1,4}[-.\s]?\d{1,9}\b"
+# -- the counters that can be requested with the `metrics` parameter, in metadata field order --
+TEXT_METRICS = ("words", "sentences", "paragraphs", "tokens", "characters")
 
-    # Find all matches in the text
-    phone_numbers = re.findall(pattern, text)
 
-    return phone_numbers
+class TextStats(NamedTuple):
+    """The counts reported in the metadata of an element, None for those that were not asked."""
 
+    words_count: Optional[int] = None
+    sentences_count: Optional[int] = None
+    paragraphs_count: Optional[int] = None
+    tokens_count: Optional[int] = None
+    characters_count: Optional[int] = None
 
-def extract_credit_card_numbers(text: str):
-    # Regex pattern for common credit card formats
-    pattern = r"\b(?:\d{4}[-\s]?){3}\d{4}\b|\b\d{16}\b"
 
-    # Find all matches in the text
-    credit_cards = re.findall(pattern, text)
+def count_tokens(
+    texts: Sequence[str],
+    tokenizer: tiktoken.Encoding,
+    batch_size: int = 1000,
+    num_threads: int = 8,
+) -> List[int]:
+    """Count the tokens of every text.
 
-    # Clean up the results (remove spaces and dashes)
-    cleaned_cards = [re.sub(r"[-\s]", "", card) for card in credit_cards]
+    Texts are tokenized in batches of `batch_size` spread over `num_threads` threads, the token
+    lists of a batch are dropped as soon as they are counted.
+    """
+    tokens_counts: List[int] = []
+    for start in range(0, len(texts), batch_size):
+        batch = list(texts[start : start + batch_size])
+        # -- a thread pool is not worth starting for a handful of texts --
+        if num_threads > 1 and len(batch) > num_threads:
+            tokens_counts.extend(
+                len(tokens) for tokens in tokenizer.encode_batch(batch, num_threads=num_threads)
+            )
+        else:
+            tokens_counts.extend(len(tokenizer.encode(text)) for text in batch)
+    return tokens_counts
+
+
+def count_text_stats(
+    texts: Sequence[str],
+    tokenizer: tiktoken.Encoding,
+    metrics: Collection[str] = TEXT_METRICS,
+    batch_size: int = 1000,
+    num_threads: int = 8,
+) -> List[TextStats]:
+    """Count the words, sentences, paragraphs, tokens and characters of every text.
+
+    Only the counters in `metrics` are computed, the texts are not tokenized at all without
+    `tokens`. Every text is visited once for all its counters, see `count_tokens` for the batching
+    of the tokenizer.
+    """
+    tokens_counts: Iterable[Optional[int]] = (
+        count_tokens(texts, tokenizer, batch_size=batch_size, num_threads=num_threads)
+        if "tokens" in metrics
+        else itertools.repeat(None)
+    )
+    with_words = "words" in metrics
+    with_sentences = "sentences" in metrics
+    with_paragraphs = "paragraphs" in metrics
+    with_characters = "characters" in metrics
+
+    return [
+        TextStats(
+            words_count=count_words(text) if with_words else None,
+            sentences_count=count_sentences(text) if with_sentences else None,
+            paragraphs_count=count_paragraphs(text) if with_paragraphs else None,
+            tokens_count=tokens_count,
+            characters_count=count_characters(text) if with_characters else None,
+        )
+        for text, tokens_count in zip(texts, tokens_counts)
+    ]
+
+
+# Updated pattern to include international formats like +34672013593. It starts where no word
+# character precedes, as a `\b` could never match before a leading "+" or "(".
+PHONE_NUMBER_PATTERN = (
+    r"(?<!\w)(?:\+\d{1,3}[-.\s]?)?(?:\(\d{1,4}\)|\d{1,4})[-.\s]?\d{1,4}[-.\s]?\d{1,9}\b"
+)
+# Regex pattern for common credit card formats
+CREDIT_CARD_PATTERN = r"\b(?:\d{4}[-\s]?){3}\d{4}\b|\b\d{16}\b"
 
-    return cleaned_cards
 
+def extract_phone_numbers(text: str):
+    return re.findall(PHONE_NUMBER_PATTERN, text)
 
-def clean_emails(text: str) -> str:
 
-    # Extract email addresses from the text
-    emails = extract_email_address(text)
+def extract_credit_card_numbers(text: str):
+    credit_cards = re.findall(CREDIT_CARD_PATTERN, text)
 
-    # Remove the email addresses from the text
-    cleaned_text = text
+    # Clean up the results (remove spaces and dashes)
+    cleaned_cards = [re.sub(r"[-\s]", "", card) for card in credit_cards]
 
-    for email in emails:
-        cleaned_text = cleaned_text.replace(email, "")
+    return cleaned_cards
 
-    return cleaned_text
 
+# -- `EMAIL_ADDRESS_PATTERN` of unstructured matches lowercased text, this one matches any case. A
+# -- match can only start where the address does, rather than being tried at every character.
+EMAIL_PATTERN = r"(?<![A-Za-z0-9.\-+_])[A-Za-z0-9.\-+_]+@[A-Za-z0-9.\-+_]+\.[A-Za-z]+"
 
-def clean_phone_numbers(text: str) -> str:
-    # Extract phone numbers from the text
-    phone_numbers = extract_phone_numbers(text)
 
-    # Remove the phone numbers from the text
-    cleaned_text = text
+@functools.lru_cache(maxsize=None)
+def get_pii_pattern(
+    emails: bool, credit_cards: bool, phone_numbers: bool
+) -> Optional[re.Pattern[str]]:
+    """Compile one pattern matching every enabled kind of personal information, None for none.
 
-    for phone in phone_numbers:
-        cleaned_text = cleaned_text.replace(phone, "")
+    Emails come first and credit cards before phone numbers, so that where two kinds overlap the
+    longer match wins, instead of a phone number eating into an email or a card number. Numbers
+    are only tried where a digit, "+" or "(" starts, which lets the scan skip over plain words.
+    """
+    numbers = [
+        pattern
+        for pattern, enabled in (
+            (CREDIT_CARD_PATTERN, credit_cards),
+            (PHONE_NUMBER_PATTERN, phone_numbers),
+        )
+        if enabled
+    ]
+    alternatives = [EMAIL_PATTERN] if emails else []
+    if numbers:
+        alternatives.append(f"(?=[\\d+(])(?:{'|'.join(numbers)})")
+    return re.compile("|".join(alternatives)) if alternatives else None
+
+
+def scrub_pii(
+    text: str,
+    delete_emails: bool = False,
+    delete_credit_cards: bool = False,
+    delete_phone_numbers: bool = False,
+) -> str:
+    """Remove the enabled kinds of personal information from `text` in a single pass."""
+    pattern = get_pii_pattern(delete_emails, delete_credit_cards, delete_phone_numbers)
+    return pattern.sub("", text) if pattern else text
 
-    return cleaned_text
 
+def clean_emails(text: str) -> str:
+    return scrub_pii(text, delete_emails=True)
 
-def clean_credit_card_numbers(text: str) -> str:
-    # Extract credit card numbers from the text
-    credit_cards = extract_credit_card_numbers(text)
 
-    # Remove the credit card numbers from the text
-    cleaned_text = text
+def clean_phone_numbers(text: str) -> str:
+    return scrub_pii(text, delete_phone_numbers=True)
 
-    for card in credit_cards:
-        cleaned_text = cleaned_text.replace(card, "")
 
-    return cleaned_text
+def clean_credit_card_numbers(text: str) -> str:
+    return scrub_pii(text, delete_credit_cards=True)
@@ -0,0 +1,72 @@
+"""Compare the csv join of a multi-file text/csv response with the previous pandas merges.
+
+Usage: PYTHONPATH=. python scripts/benchmark-csv-join.py [--files N] [--copies N] [FILE]
+
+Every file is the elements of `FILE`, an element json file, repeated `--copies` times, under its
+own filename. Every other file also reports page numbers, so the files don't all have the same
+columns. The previous join parsed the csv of every file back with `pd.read_csv` and merged it into
+the table so far, the current one writes the DataFrame of every file under the union of the
+columns.
+"""
+
+import argparse
+import io
+import time
+from typing import Callable, List
+
+import pandas as pd
+from unstructured.staging.base import convert_to_dataframe, elements_from_json
+
+from prepline_general.api.general import iter_joined_csv
+
+
+def previous_join(csvs: List[str]) -> str:
+    """`join_responses` before `iter_joined_csv`."""
+    data = pd.read_csv(io.StringIO(csvs[0]))
+    for csv in csvs[1:]:
+        data = data.merge(pd.read_csv(io.StringIO(csv)), how="outer")
+    return data.to_csv()
+
+
+def run(func: Callable[[], str], repeat: int):
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", nargs="?", default="sample-docs/spring-weather.html.json")
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frames = []
+    for index in range(args.files):
+        elements = elements_from_json(args.file) * args.copies
+        for number, element in enumerate(elements):
+            element.metadata.filename = f"file-{index}.html"
+            if index % 2:
+                element.metadata.page_number = number // 10 + 1
+        frames.append(convert_to_dataframe(elements))
+    # -- the previous join started from the csv text each file was answered with --
+    csvs = [frame.to_csv(index=False) for frame in frames]
+
+    previous_seconds, previous_csv = run(lambda: previous_join(csvs), args.repeat)
+    joined_seconds, joined_csv = run(lambda: "".join(iter_joined_csv(frames)), args.repeat)
+
+    rows = sum(len(frame) for frame in frames)
+    assert len(pd.read_csv(io.StringIO(joined_csv))) == rows
+    print(f"{args.files} files, {rows} rows, {len(joined_csv) / 1024 / 1024:.1f} MB of csv")
+    print(f"  read_csv + merge       {previous_seconds * 1000:>10.1f} ms")
+    print(f"  iter_joined_csv        {joined_seconds * 1000:>10.1f} ms")
+    print(f"  speedup                {previous_seconds / joined_seconds:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
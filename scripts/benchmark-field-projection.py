@@ -0,0 +1,102 @@
+"""Compare the json of every element with the json of only the fields a caller asks for.
+
+Usage: PYTHONPATH=. python scripts/benchmark-field-projection.py [--copies N] [--repeat N]
+    [--fields F,...] [--metadata-fields F,...] [FILE ...]
+
+Element json files, like `sample-docs/spring-weather.html.json`, are loaded as they are, other
+documents are partitioned with the `fast` strategy, and their elements are repeated `--copies`
+times. Elements without coordinates get the bounding box and layout the `hi_res` strategy reports
+for every element, unless `--no-coordinates` is given. Both paths run the elements through
+`project_metadata`, when there are metadata fields, and `serialize_elements` and dump the result
+like the json response does.
+"""
+
+import argparse
+import copy
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from unstructured.documents.coordinates import PixelSpace
+from unstructured.documents.elements import CoordinatesMetadata, Element
+from unstructured.partition.auto import partition
+from unstructured.staging.base import elements_from_json
+
+from prepline_general.api.general import _dump_json
+from prepline_general.api.postprocessing import project_metadata, serialize_elements
+
+
+def load_elements(filename: str) -> List[Element]:
+    if filename.endswith(".json"):
+        return elements_from_json(filename)
+    return partition(filename=filename, strategy="fast")
+
+
+def serialize(
+    elements: List[Element],
+    fields: Optional[Sequence[str]],
+    metadata_fields: Optional[Sequence[str]],
+) -> str:
+    stream = iter(elements)
+    if metadata_fields is not None:
+        stream = project_metadata(stream, metadata_fields)
+    return _dump_json(serialize_elements(stream, fields))
+
+
+def run(
+    make_elements: Callable[[], List[Element]], func: Callable[[List[Element]], str], repeat: int
+) -> Tuple[float, str]:
+    best = float("inf")
+    body = ""
+    for _ in range(repeat):
+        # -- the projection replaces the metadata, so every run gets its own elements --
+        elements = make_elements()
+        start = time.perf_counter()
+        body = func(elements)
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", default=["sample-docs/spring-weather.html.json"])
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fields", default="type,text")
+    parser.add_argument("--metadata-fields", default="page_number")
+    parser.add_argument("--no-coordinates", action="store_true")
+    args = parser.parse_args()
+
+    elements = [element for filename in args.files for element in load_elements(filename)]
+    if not args.no_coordinates:
+        for index, element in enumerate(elements):
+            if element.metadata.coordinates is None:
+                top, bottom = 100.5 + index * 40.25, 130.75 + index * 40.25
+                element.metadata.coordinates = CoordinatesMetadata(
+                    points=((200.5, top), (200.5, bottom), (1500.75, bottom), (1500.75, top)),
+                    system=PixelSpace(1700, 2200),
+                )
+    elements = elements * args.copies
+    fields = args.fields.split(",")
+    metadata_fields = args.metadata_fields.split(",")
+
+    full_seconds, full_body = run(
+        lambda: copy.deepcopy(elements), lambda e: serialize(e, None, None), args.repeat
+    )
+    projected_seconds, projected_body = run(
+        lambda: copy.deepcopy(elements),
+        lambda e: serialize(e, fields, metadata_fields),
+        args.repeat,
+    )
+
+    print(f"{len(elements)} elements, fields {fields}, metadata fields {metadata_fields}")
+    print(f"  all fields  {len(full_body) / 1024 / 1024:>8.1f} MB {full_seconds * 1000:>10.1f} ms")
+    print(
+        f"  projected   {len(projected_body) / 1024 / 1024:>8.1f} MB"
+        f" {projected_seconds * 1000:>10.1f} ms"
+    )
+    print(f"  size        {len(full_body) / len(projected_body):>8.2f}x smaller")
+    print(f"  speedup     {full_seconds / projected_seconds:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare the json partition response with FastAPI's default response serialization.
+
+Usage: PYTHONPATH=. python scripts/benchmark-json-response.py [--size-mb N] [--repeat N] [FILE ...]
+
+Element json files, like `sample-docs/spring-weather.html.json`, are loaded as they are, other
+documents are partitioned with the `fast` strategy. Their elements are repeated until the response
+is about `--size-mb` large. The default path validates the element dicts into a
+`PartitionResponse`, converts it with `jsonable_encoder` and renders a `JSONResponse`, the fast
+path renders a `PartitionJSONResponse`. Both are checked to produce the same bytes.
+"""
+
+import argparse
+import itertools
+import time
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from unstructured.documents.elements import Element
+from unstructured.partition.auto import partition
+from unstructured.staging.base import elements_from_json
+
+from prepline_general.api.general import PartitionJSONResponse
+from prepline_general.api.models.form_params import PartitionResponse, PartitionResponseMetadata
+
+
+def load_elements(filename: str) -> List[Element]:
+    if filename.endswith(".json"):
+        return elements_from_json(filename)
+    return partition(filename=filename, strategy="fast")
+
+
+def run(func: Callable[[], bytes], repeat: int):
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", default=["sample-docs/spring-weather.html.json"])
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    elements = [element for filename in args.files for element in load_elements(filename)]
+    documents = [element.to_dict() for element in elements]
+    sample_size = len(PartitionJSONResponse(documents).body)
+    copies = max(1, round(args.size_mb * 1024 * 1024 / sample_size))
+    documents = list(itertools.chain.from_iterable(itertools.repeat(documents, copies)))
+    metadata = PartitionResponseMetadata(words_count=len(documents))
+
+    def default_response() -> bytes:
+        content: Dict[str, Any] = jsonable_encoder(
+            PartitionResponse(documents=documents, metadata=metadata)
+        )
+        return JSONResponse(content).body
+
+    def fast_response() -> bytes:
+        return PartitionJSONResponse(
+            PartitionResponse.model_construct(documents=documents, metadata=metadata)
+        ).body
+
+    default_seconds, default_body = run(default_response, args.repeat)
+    fast_seconds, fast_body = run(fast_response, args.repeat)
+    assert fast_body == default_body, "PartitionJSONResponse does not match the default response"
+
+    print(f"{len(documents)} elements, {len(fast_body) / 1024 / 1024:.1f} MB of json")
+    print(f"  jsonable_encoder       {default_seconds * 1000:>10.1f} ms")
+    print(f"  PartitionJSONResponse  {fast_seconds * 1000:>10.1f} ms")
+    print(f"  speedup                {default_seconds / fast_seconds:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
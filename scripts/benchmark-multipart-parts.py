@@ -0,0 +1,72 @@
+"""Compare base64 and binary parts of a multipart/mixed response.
+
+Usage: PYTHONPATH=. python scripts/benchmark-multipart-parts.py [--parts N] [--part-kb N]
+    [--repeat N]
+
+Sends `--parts` random parts of `--part-kb` each through a `MultipartMixedResponse`, once with the
+default base64 parts and once with `binary=True`, and reports the bytes put on the wire and the
+CPU time spent building the messages. Random bytes stand in for Arrow or Parquet parts, which do
+not compress and are already binary.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List, Tuple
+
+from prepline_general.api.general import MultipartMixedResponse
+
+
+async def _receive():
+    # -- the client never disconnects --
+    await asyncio.Event().wait()
+
+
+def send_parts(parts: List[bytes], binary: bool) -> int:
+    sent = 0
+
+    async def send(message):
+        nonlocal sent
+        sent += len(message.get("body", b""))
+
+    response = MultipartMixedResponse(
+        iter(parts), content_type="application/vnd.apache.parquet", binary=binary
+    )
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    asyncio.run(response(scope, _receive, send))
+    return sent
+
+
+def run(parts: List[bytes], binary: bool, repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    sent = 0
+    for _ in range(repeat):
+        start = time.process_time()
+        sent = send_parts(parts, binary)
+        best = min(best, time.process_time() - start)
+    return best, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parts", type=int, default=200)
+    parser.add_argument("--part-kb", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    parts = [os.urandom(args.part_kb * 1024) for _ in range(args.parts)]
+    payload = sum(len(part) for part in parts)
+
+    base64_seconds, base64_sent = run(parts, binary=False, repeat=args.repeat)
+    binary_seconds, binary_sent = run(parts, binary=True, repeat=args.repeat)
+
+    print(f"{args.parts} parts, {payload / 1024 / 1024:.1f} MB of payload")
+    print(f"  base64  {base64_sent / 1024 / 1024:>8.1f} MB sent {base64_seconds * 1000:>10.1f} ms")
+    print(f"  binary  {binary_sent / 1024 / 1024:>8.1f} MB sent {binary_seconds * 1000:>10.1f} ms")
+    print(f"  bytes saved  {1 - binary_sent / base64_sent:>8.1%}")
+    print(f"  speedup      {base64_seconds / binary_seconds:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Compare the pdf splitting used by parallel mode with the previous pypdf implementation.
+
+Usage: PYTHONPATH=. python scripts/benchmark-pdf-splits.py [--split-size N] [--repeat N]
+
+Every `sample-docs/layout-parser-paper*.pdf` is split, along with a synthetic 1000 page pdf made of
+copies of the first sample. Peak memory is the growth of the process resident set size over the
+whole run of each implementation.
+"""
+
+import argparse
+import io
+import resource
+import time
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+
+import pypdfium2 as pdfium  # type: ignore
+from pypdf import PdfReader, PdfWriter
+
+from prepline_general.api.splitters import get_pdf_splits
+
+SAMPLE_DOCS = Path(__file__).parent.parent / "sample-docs"
+
+
+def pypdf_splits(pdf_bytes: bytes, split_size: int) -> Iterator[Tuple[bytes, int]]:
+    """The implementation of `get_pdf_splits` before it was moved to pypdfium2."""
+    pdf_pages = PdfReader(io.BytesIO(pdf_bytes)).pages
+    offset = 0
+
+    while offset < len(pdf_pages):
+        new_pdf = PdfWriter()
+        pdf_buffer = io.BytesIO()
+
+        end = offset + split_size
+        for page in pdf_pages[offset:end]:
+            new_pdf.add_page(page)
+
+        new_pdf.write(pdf_buffer)
+        pdf_buffer.seek(0)
+
+        yield (pdf_buffer.read(), offset)
+        offset += split_size
+
+
+def pdfium_splits(pdf_bytes: bytes, split_size: int) -> Iterator[Tuple[io.BytesIO, int]]:
+    pdf = pdfium.PdfDocument(io.BytesIO(pdf_bytes))
+    try:
+        yield from get_pdf_splits(pdf, split_size=split_size)
+    finally:
+        pdf.close()
+
+
+def make_synthetic_pdf(source: Path, page_count: int) -> bytes:
+    src = pdfium.PdfDocument(str(source))
+    pdf = pdfium.PdfDocument.new()
+    for index in range(page_count):
+        pdf.import_pages(src, pages=[index % len(src)], index=index)
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    pdf.close()
+    src.close()
+    return buffer.getvalue()
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(
+    split: Callable[[bytes, int], Iterator[Tuple[object, int]]],
+    pdf_bytes: bytes,
+    split_size: int,
+    repeat: int,
+) -> Tuple[float, int]:
+    best = float("inf")
+    split_count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # -- consume the splits one at a time, like the parallel mode dispatcher does --
+        split_count = sum(1 for _ in split(pdf_bytes, split_size))
+        best = min(best, time.perf_counter() - start)
+    return best, split_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--split-size", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    samples = sorted(SAMPLE_DOCS.glob("layout-parser-paper*.pdf"))
+    documents = [(path.name, path.read_bytes()) for path in samples]
+    documents.append(("synthetic-1000-pages.pdf", make_synthetic_pdf(samples[0], 1000)))
+
+    # -- pdfium runs first, so that its peak is not hidden by the higher pypdf one --
+    for name, split in (("pypdfium2", pdfium_splits), ("pypdf", pypdf_splits)):
+        rss_before = max_rss_mb()
+        print(f"{name}:")
+        for doc_name, pdf_bytes in documents:
+            seconds, split_count = run(split, pdf_bytes, args.split_size, args.repeat)
+            print(f"  {doc_name:<40} {split_count:>5} splits {seconds * 1000:>10.1f} ms")
+        print(f"  peak rss growth: {max_rss_mb() - rss_before:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare the single pass PII scrubbing of the api with the previous one pass per kind cleaners.
+
+Usage: PYTHONPATH=. python scripts/benchmark-pii-scrubbing.py [--elements N] [--repeat N]
+
+The texts are made up paragraphs dense in emails, phone numbers and credit card numbers, with all
+three kinds deleted, as with `delete_emails`, `delete_credit_cards` and `delete_phone_numbers`.
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Callable, List
+
+from unstructured.cleaners.extract import extract_email_address
+
+from prepline_general.api.utils import scrub_pii
+
+PREVIOUS_PHONE_NUMBER_PATTERN = (
+    r"\b(?:\+\d{1,3}[-.\s]?)?(?:\(\d{1,4}\)|\d{1,4})[-.\s]?\d{1,4}[-.\s]?\d{1,9}\b"
+)
+PREVIOUS_CREDIT_CARD_PATTERN = r"\b(?:\d{4}[-\s]?){3}\d{4}\b|\b\d{16}\b"
+
+
+def previous_cleanup(text: str) -> str:
+    """`clean_emails`, `clean_credit_card_numbers` and `clean_phone_numbers` before `scrub_pii`."""
+    for email in extract_email_address(text):
+        text = text.replace(email, "")
+    cards = re.findall(PREVIOUS_CREDIT_CARD_PATTERN, text)
+    for card in [re.sub(r"[-\s]", "", card) for card in cards]:
+        text = text.replace(card, "")
+    for phone in re.findall(PREVIOUS_PHONE_NUMBER_PATTERN, text):
+        text = text.replace(phone, "")
+    return text
+
+
+def current_cleanup(text: str) -> str:
+    return scrub_pii(text, delete_emails=True, delete_credit_cards=True, delete_phone_numbers=True)
+
+
+def make_text(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(5, 40)):
+        kind = rng.randrange(4)
+        if kind == 0:
+            sentences.append(f"Contact user{rng.randrange(10**4)}@example{rng.randrange(50)}.com.")
+        elif kind == 1:
+            sentences.append(f"Call +{rng.randrange(1, 99)} {rng.randrange(10**8, 10**9)} today.")
+        elif kind == 2:
+            groups = " ".join(str(rng.randrange(1000, 10000)) for _ in range(4))
+            sentences.append(f"The card {groups} was charged.")
+        else:
+            sentences.append("The invoice is attached, please settle it within thirty days.")
+    return " ".join(sentences)
+
+
+def run(cleanup: Callable[[str], str], texts: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            cleanup(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = [make_text(rng) for _ in range(args.elements)]
+    megabytes = sum(len(text) for text in texts) / 1e6
+
+    previous_seconds = run(previous_cleanup, texts, args.repeat)
+    current_seconds = run(current_cleanup, texts, args.repeat)
+
+    print(f"{args.elements} elements, {megabytes:.1f} MB of text")
+    print(f"  one pass per kind  {previous_seconds * 1000:>10.1f} ms")
+    print(f"  scrub_pii          {current_seconds * 1000:>10.1f} ms")
+    print(f"  speedup            {previous_seconds / current_seconds:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare the element counters of the api post-processing with and without the text stats cache.
+
+Usage: PYTHONPATH=. python scripts/benchmark-text-stats-cache.py [--pages N] [--repeat N]
+
+The document is a synthetic report with a running header, a footer with the page number, a
+section title and a few body paragraphs on every page. It is counted once without cache, once
+with an empty cache, and once more with the cache it left behind, as a second request for a
+report of the same series would be.
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Callable, List, Optional
+
+import tiktoken
+from unstructured.documents.elements import Element, Footer, Header, NarrativeText, Title
+
+from prepline_general.api.postprocessing import CountTextStats, TextStatsCache
+from prepline_general.api.utils import TEXT_METRICS
+
+PROSE = [
+    "The quarterly report is attached. Please review it before Friday!",
+    "Revenue grew 12% year over year, driven by the new subscription tier.",
+    "Section 4.2 describes the retention policy for archived documents in detail, including "
+    "the exceptions that apply to legal holds, and how long backups are kept after deletion.",
+    "Costs were flat, but headcount grew in every region except the north.",
+]
+SECTIONS = ["Summary", "Financial Statements", "Operations", "Outlook", "Risk Factors"]
+
+
+def make_report(pages: int, seed: int) -> List[Element]:
+    rng = random.Random(seed)
+    elements: List[Element] = []
+    for page in range(1, pages + 1):
+        elements.append(Header("ACME Corporation | Annual Report 2025 | Confidential"))
+        elements.append(Title(rng.choice(SECTIONS)))
+        for paragraph in range(rng.randint(3, 8)):
+            sentences = " ".join(rng.choice(PROSE) for _ in range(rng.randint(2, 6)))
+            elements.append(NarrativeText(f"{page}.{paragraph} {sentences}"))
+        elements.append(Footer(f"Page {page} of {pages}"))
+        elements.append(Footer("© 2025 ACME Corporation. All rights reserved."))
+    return elements
+
+
+def run(func: Callable[[], None], repeat: int, setup: Callable[[], None] = lambda: None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = tiktoken.get_encoding("o200k_base")
+    report = make_report(args.pages, seed=0)
+    next_report = make_report(args.pages, seed=1)
+    cache = TextStatsCache(max_size=50_000)
+
+    def count(elements: List[Element], cache: Optional[TextStatsCache]) -> None:
+        stage = CountTextStats(TEXT_METRICS, tokenizer, num_threads=args.threads, cache=cache)
+        for _ in stage(elements):
+            pass
+
+    uncached = run(lambda: count(report, None), args.repeat)
+
+    def count_report_first() -> None:
+        cache.clear()
+        count(report, cache)
+
+    cold = run(lambda: count(report, cache), args.repeat, setup=cache.clear)
+    warm = run(lambda: count(next_report, cache), args.repeat, setup=count_report_first)
+    repeated = run(lambda: count(report, cache), args.repeat, setup=count_report_first)
+
+    print(f"{args.pages} pages, {len(report)} elements")
+    print(f"  no cache               {uncached * 1000:>10.1f} ms")
+    print(f"  empty cache            {cold * 1000:>10.1f} ms  ({uncached / cold:.2f}x)")
+    print(f"  next report            {warm * 1000:>10.1f} ms  ({uncached / warm:.2f}x)")
+    print(f"  same report again      {repeated * 1000:>10.1f} ms  ({uncached / repeated:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
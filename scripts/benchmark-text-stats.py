@@ -0,0 +1,86 @@
+"""Compare the element counters of the api post-processing with the previous per-element loop.
+
+Usage: PYTHONPATH=. python scripts/benchmark-text-stats.py [--elements N] [--threads N] [--repeat N]
+
+The texts are random runs of a few made up sentences and paragraphs, one per element. Both
+implementations are checked to produce the same counts.
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Callable, List
+
+import tiktoken
+
+from prepline_general.api.utils import (
+    TextStats,
+    count_characters,
+    count_paragraphs,
+    count_sentences,
+    count_text_stats,
+    count_words,
+)
+
+PROSE = [
+    "The quarterly report is attached. Please review it before Friday!",
+    "Revenue grew 12% year over year, driven by the new subscription tier.\n\nCosts were flat.",
+    "Is the meeting still on? I could not find the invite.",
+    "Section 4.2 describes the retention policy for archived documents in detail, including "
+    "the exceptions that apply to legal holds, and how long backups are kept after deletion.",
+    "Title",
+]
+
+
+def per_element_loop(texts: List[str], tokenizer: tiktoken.Encoding) -> List[TextStats]:
+    """The counters as computed by the post-processing loop before `count_text_stats`."""
+    return [
+        TextStats(
+            words_count=count_words(text),
+            sentences_count=count_sentences(text),
+            paragraphs_count=count_paragraphs(text),
+            tokens_count=len(tokenizer.encode(text)),
+            characters_count=count_characters(text),
+        )
+        for text in texts
+    ]
+
+
+def run(func: Callable[[], List[TextStats]], repeat: int):
+    best = float("inf")
+    result: List[TextStats] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, default=50_000)
+    parser.add_argument("--threads", type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = tiktoken.get_encoding("o200k_base")
+    rng = random.Random(0)
+    texts = [
+        " ".join(rng.choice(PROSE) for _ in range(rng.randint(1, 6))) for _ in range(args.elements)
+    ]
+
+    loop_seconds, loop_stats = run(lambda: per_element_loop(texts, tokenizer), args.repeat)
+    stats_seconds, stats = run(
+        lambda: count_text_stats(texts, tokenizer, num_threads=args.threads), args.repeat
+    )
+    assert stats == loop_stats, "count_text_stats does not match the per-element loop"
+
+    print(f"{args.elements} elements, {sum(s.tokens_count for s in stats)} tokens")
+    print(f"  per-element loop       {loop_seconds * 1000:>10.1f} ms")
+    print(f"  count_text_stats ({args.threads:>2}t) {stats_seconds * 1000:>10.1f} ms")
+    print(f"  speedup                {loop_seconds / stats_seconds:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env bash
+
+# parallel-mode-backends-test.sh
+# Start several local api instances as parallel mode backends, and one coordinator that spreads the
+# pages of a pdf over them. Then partition a pdf through the coordinator, stop one backend and
+# partition it again, to check that the pool keeps working without it.
+# Note the filepaths assume you ran this from the top level
+
+# shellcheck disable=SC2317  # Shellcheck complains that trap functions are unreachable...
+
+NUM_BACKENDS=${NUM_BACKENDS:-3}
+COORDINATOR_PORT=${COORDINATOR_PORT:-8000}
+FIRST_BACKEND_PORT=${FIRST_BACKEND_PORT:-8001}
+TEST_FILE=${TEST_FILE:-sample-docs/layout-parser-paper.pdf}
+
+export PYTHONPATH=${PYTHONPATH:-.}
+
+pids=()
+urls=()
+
+cleanup() {
+    for pid in "${pids[@]}"; do
+        kill "$pid" 2>/dev/null
+    done
+}
+trap cleanup EXIT
+
+wait_for() {
+    for _ in $(seq 1 120); do
+        if curl -s "http://localhost:$1/healthcheck" >/dev/null; then
+            return 0
+        fi
+        sleep 1
+    done
+    echo "Server on port $1 did not start"
+    exit 1
+}
+
+for i in $(seq 0 $((NUM_BACKENDS - 1))); do
+    port=$((FIRST_BACKEND_PORT + i))
+    uvicorn prepline_general.api.app:app --port "$port" --log-level warning &
+    pids+=($!)
+    urls+=("http://localhost:$port/general/v0/general")
+done
+
+backend_urls=$(IFS=,; echo "${urls[*]}")
+
+UNSTRUCTURED_PARALLEL_MODE_ENABLED=true \
+UNSTRUCTURED_PARALLEL_MODE_URL="$backend_urls" \
+UNSTRUCTURED_PARALLEL_MODE_HEALTHCHECK_INTERVAL=1 \
+    uvicorn prepline_general.api.app:app --port "$COORDINATOR_PORT" --log-level info &
+pids+=($!)
+
+for i in $(seq 0 $((NUM_BACKENDS - 1))); do
+    wait_for $((FIRST_BACKEND_PORT + i))
+done
+wait_for "$COORDINATOR_PORT"
+
+partition() {
+    length=$(curl -s "http://localhost:$COORDINATOR_PORT/general/v0/general" \
+        -F "files=@$TEST_FILE" | jq '.documents | length')
+    if [[ -z "$length" || "$length" == "0" ]]; then
+        echo "Partitioning through the backends failed!"
+        exit 1
+    fi
+    echo "Partitioned $TEST_FILE into $length elements"
+}
+
+echo "Partitioning with $NUM_BACKENDS backends: $backend_urls"
+partition
+
+echo "Stopping the backend on port $FIRST_BACKEND_PORT"
+kill "${pids[0]}"
+sleep 3
+partition
+
+curl -s "http://localhost:$COORDINATOR_PORT/metrics"
@@ -1,19 +1,30 @@
+import asyncio
+import base64
+import contextlib
 import io
+import json
 import os
 import tempfile
+import time
 import uuid
 from pathlib import Path
-from unittest.mock import ANY, Mock
+from unittest.mock import ANY, AsyncMock, Mock
 
+import httpx
+import openpyxl
 import pandas as pd
+import pypdfium2 as pdfium
 import pytest
-import requests
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
 from pypdf import PdfReader, PdfWriter
+from unstructured.documents.elements import Text, Title
 
-from prepline_general.api import general
+from prepline_general.api import arrow, general, parallel_mode
 from prepline_general.api.app import app
+from prepline_general.api.parallel_mode import get_parallel_mode_dispatcher
 
 MAIN_API_ROUTE = "general/v0/general"
 
@@ -546,6 +557,58 @@ def test_general_api_returns_401(monkeypatch):
     assert response.status_code == 401
 
 
+def test_multi_file_threads_preserve_upload_order(monkeypatch):
+    """
+    Verify that files partitioned concurrently are still returned in the order they were uploaded
+    """
+    monkeypatch.setenv("UNSTRUCTURED_MULTI_FILE_THREADS", "4")
+
+    def mock_pipeline_api(file, filename, **kwargs):
+        # -- the first upload finishes last --
+        time.sleep(0.2 if filename.endswith("fake-text.txt") else 0)
+        return [{"filename": filename}]
+
+    monkeypatch.setattr(general, "pipeline_api", mock_pipeline_api)
+
+    test_files = [
+        Path("sample-docs") / "fake-text.txt",
+        Path("sample-docs") / "fake-xml.xml",
+        Path("sample-docs") / "fake-html.html",
+    ]
+    # -- the lifespan of the app shuts the pool down --
+    with TestClient(app) as client:
+        response = client.post(
+            MAIN_API_ROUTE,
+            files=[("files", (str(test_file), open(test_file, "rb"))) for test_file in test_files],
+        )
+        executor = general.get_multi_file_executor()
+        assert executor is general.get_multi_file_executor()
+        assert general._multi_file_thread_count == 4
+
+    assert response.status_code == 200
+    assert response.json() == [[{"filename": str(test_file)}] for test_file in test_files]
+    assert general._multi_file_executor is None
+    assert general._multi_file_thread_count == 0
+
+
+def test_invalid_multi_file_threads_partitions_files_one_after_another(monkeypatch):
+    monkeypatch.setenv("UNSTRUCTURED_MULTI_FILE_THREADS", "four")
+    monkeypatch.setattr(
+        general, "pipeline_api", lambda file, filename, **kwargs: [{"filename": filename}]
+    )
+    client = TestClient(app)
+    test_files = [Path("sample-docs") / "fake-text.txt", Path("sample-docs") / "fake-xml.xml"]
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"))) for test_file in test_files],
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [[{"filename": str(test_file)}] for test_file in test_files]
+    assert general.get_multi_file_executor() is None
+
+
 class MockResponse:
     def __init__(self, status_code):
         self.status_code = status_code
@@ -556,7 +619,8 @@ class MockResponse:
         return self.body
 
 
-def call_api_using_test_client(
+async def call_api_using_test_client(
+    _client,
     request_url: str,
     api_key: str,
     filename: str,
@@ -565,13 +629,13 @@ def call_api_using_test_client(
     client: TestClient,
     **partition_kwargs,
 ) -> str:
-    """Exact copy of call_api from call_api.py, but with the test client parameter added."""
+    """Exact copy of call_api from general.py, but posting through the test client."""
     headers = {"unstructured-api-key": api_key}
 
     response = client.post(
         MAIN_API_ROUTE,
         files={"files": (filename, file, content_type)},
-        data=partition_kwargs,
+        data={key: value for key, value in partition_kwargs.items() if value is not None},
         headers=headers,
     )
 
@@ -743,9 +807,9 @@ def test_parallel_mode_returns_errors(monkeypatch):
     monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
     monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "unused")
     monkeypatch.setattr(
-        requests,
+        httpx.AsyncClient,
         "post",
-        lambda *args, **kwargs: MockResponse(status_code=500),
+        AsyncMock(return_value=MockResponse(status_code=500)),
     )
 
     client = TestClient(app)
@@ -759,9 +823,9 @@ def test_parallel_mode_returns_errors(monkeypatch):
     assert response.status_code == 500
 
     monkeypatch.setattr(
-        requests,
+        httpx.AsyncClient,
         "post",
-        lambda *args, **kwargs: MockResponse(status_code=400),
+        AsyncMock(return_value=MockResponse(status_code=400)),
     )
 
     client = TestClient(app)
@@ -786,7 +850,7 @@ def test_partition_file_via_api_will_retry(monkeypatch, mocker):
     num_calls = 0
 
     # Validate the retry count by returning an error the first 2 times
-    def mock_response(*args, **kwargs):
+    async def mock_response(*args, **kwargs):
         nonlocal num_calls
         num_calls += 1
 
@@ -796,13 +860,13 @@ def test_partition_file_via_api_will_retry(monkeypatch, mocker):
         return MockResponse(status_code=200)
 
     monkeypatch.setattr(
-        requests,
+        httpx.AsyncClient,
         "post",
         mock_response,
     )
 
     # This needs to be mocked when we return 200
-    mocker.patch("prepline_general.api.general.elements_from_json")
+    mocker.patch("prepline_general.api.general._elements_from_response")
 
     client = TestClient(app)
     test_file = Path("sample-docs") / "layout-parser-paper-fast.pdf"
@@ -824,10 +888,10 @@ def test_partition_file_via_api_not_retryable_error_code(monkeypatch, mocker):
     monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_THREADS", "1")
     monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_RETRY_ATTEMPTS", "3")
 
-    remote_partition = Mock(side_effect=HTTPException(status_code=401))
+    remote_partition = AsyncMock(side_effect=HTTPException(status_code=401))
 
     monkeypatch.setattr(
-        requests,
+        httpx.AsyncClient,
         "post",
         remote_partition,
     )
@@ -844,6 +908,148 @@ def test_partition_file_via_api_not_retryable_error_code(monkeypatch, mocker):
     assert remote_partition.called_once()
 
 
+@pytest.fixture
+def fresh_parallel_mode_dispatcher():
+    """Start the test without a process-wide dispatcher, and shut down the one it starts."""
+    parallel_mode.shutdown_parallel_mode_dispatcher()
+    yield
+    parallel_mode.shutdown_parallel_mode_dispatcher()
+
+
+def test_parallel_mode_dispatcher_is_shared_and_bounded(
+    monkeypatch, fresh_parallel_mode_dispatcher
+):
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_CONCURRENCY", "2")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_POOL_SIZE", "3")
+
+    dispatcher = get_parallel_mode_dispatcher()
+    assert get_parallel_mode_dispatcher() is dispatcher
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def sub_request(i):
+        nonlocal in_flight, max_in_flight
+        async with dispatcher.semaphore:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+        return i
+
+    # -- two documents fanning out at once still share the node-wide bound --
+    results = list(
+        zip(
+            dispatcher.map_in_order(sub_request, range(10), window=10),
+            dispatcher.map_in_order(sub_request, range(10, 20), window=10),
+        )
+    )
+    assert results == [(i, i + 10) for i in range(10)]
+    assert max_in_flight <= 2
+
+    # -- requests sent past the semaphore still open no more connections than the pool size --
+    connections = 0
+
+    async def serve(reader, writer):
+        nonlocal connections
+        connections += 1
+        # -- answer the keep-alive requests of the connection until the client closes it --
+        with contextlib.suppress(asyncio.IncompleteReadError):
+            while await reader.readuntil(b"\r\n\r\n"):
+                await asyncio.sleep(0.01)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+
+    server = dispatcher.run(asyncio.start_server(serve, "127.0.0.1", 0))
+    url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+
+    async def send_all():
+        return await asyncio.gather(*(dispatcher.client.get(url) for _ in range(12)))
+
+    try:
+        responses = dispatcher.run(send_all())
+    finally:
+        server.close()
+
+    assert [response.text for response in responses] == ["ok"] * 12
+    assert connections == 3
+
+
+def test_call_api_retries_timeouts(monkeypatch, fresh_parallel_mode_dispatcher):
+    """
+    Verify that a timed out request is retried, and reported as a 504 if it keeps timing out
+    """
+    remote_partition = AsyncMock(side_effect=httpx.ReadTimeout("timed out"))
+    monkeypatch.setattr(httpx.AsyncClient, "post", remote_partition)
+
+    dispatcher = get_parallel_mode_dispatcher()
+    with pytest.raises(HTTPException) as excinfo:
+        dispatcher.run(
+            general.call_api(
+                dispatcher.client, "unused", "", "fake.pdf", io.BytesIO(b""), "application/pdf"
+            )
+        )
+
+    assert excinfo.value.status_code == 504
+    assert remote_partition.call_count == 3
+
+
+def test_parallel_mode_local_backend_numbers_pages(monkeypatch):
+    """
+    Verify that local parallel mode partitions every split in the engine with the right page offset
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_BACKEND", "local")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "1")
+
+    mock_engine = Mock(max_workers=2)
+    mock_engine.partition.return_value = []
+    monkeypatch.setattr(general, "get_local_split_engine", lambda: mock_engine)
+    remote_partition = Mock()
+    monkeypatch.setattr(general, "call_api", remote_partition)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "DA-1p-with-duplicate-pages.pdf"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "application/pdf"))],
+        data={"starting_page_number": 4},
+    )
+
+    assert response.status_code == 200
+    remote_partition.assert_not_called()
+    page_numbers = sorted(
+        call.kwargs["starting_page_number"] for call in mock_engine.partition.call_args_list
+    )
+    assert page_numbers == [4, 5, 6]
+
+
+def test_parallel_mode_local_backend_matches_single_mode(monkeypatch):
+    """
+    Verify that local parallel mode returns the same elements as partitioning the whole file
+    """
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "layout-parser-paper-fast.pdf"
+
+    def get_texts_and_pages():
+        response = client.post(
+            MAIN_API_ROUTE,
+            files=[("files", (str(test_file), open(test_file, "rb"), "application/pdf"))],
+            data={"strategy": "fast"},
+        )
+        assert response.status_code == 200
+        return [(e["text"], e["metadata"]["page_number"]) for e in response.json()["documents"]]
+
+    expected = get_texts_and_pages()
+
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_BACKEND", "local")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "1")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_THREADS", "2")
+
+    assert get_texts_and_pages() == expected
+
+
 def test_chunking_strategy_param():
     """
     Verify that responses do not chunk elements unless requested
@@ -1146,3 +1352,750 @@ def test_include_slide_notes(monkeypatch, test_default, include_slide_notes, tes
         assert "Here are important notes" == df["text"][0]
     else:
         assert "Here are important notes" != df["text"][0]
+
+
+def read_multipart_parts(response):
+    boundary = response.headers["content-type"].split('boundary="')[1].rstrip('"')
+    parts = response.content.split(b"--" + boundary.encode())[1:]
+    return [
+        base64.b64decode(part.split(b"\r\n\r\n", 1)[1].strip()) for part in parts if part.strip()
+    ]
+
+
+def test_parallel_mode_streams_page_chunks_in_order(monkeypatch):
+    """
+    Verify that with stream_pdf_pages, every chunk of pages is sent as its own post-processed part
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_BACKEND", "local")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "1")
+
+    def mock_partition(file, starting_page_number, **kwargs):
+        # -- later pages finish first, the parts must still come out in page order --
+        time.sleep(0.1 / starting_page_number)
+        return [Text(f"Text on page {starting_page_number}")]
+
+    mock_engine = Mock(max_workers=3)
+    mock_engine.partition.side_effect = mock_partition
+    monkeypatch.setattr(general, "get_local_split_engine", lambda: mock_engine)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "DA-1p-with-duplicate-pages.pdf"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "application/pdf"))],
+        data={"stream_pdf_pages": "true"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("multipart/mixed")
+    parts = [json.loads(part) for part in read_multipart_parts(response)]
+    assert [[e["text"] for e in part["documents"]] for part in parts] == [
+        ["Text on page 1"],
+        ["Text on page 2"],
+        ["Text on page 3"],
+    ]
+    assert all(part["metadata"]["words_count"] == 4 for part in parts)
+
+
+def test_parallel_mode_partitions_small_documents_in_the_engine(monkeypatch):
+    """
+    Verify that a document that fits in a single split is partitioned in the partition engine
+    when it is enabled
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "10")
+    monkeypatch.setattr(general, "partition", Mock(side_effect=AssertionError("in process")))
+    mock_engine = Mock(max_workers=3)
+    mock_engine.partition.return_value = [Text("Text of the whole document")]
+    monkeypatch.setattr(general, "get_partition_engine", lambda: mock_engine)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "DA-1p-with-duplicate-pages.pdf"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "application/pdf"))],
+    )
+
+    assert response.status_code == 200
+    assert [e["text"] for e in response.json()["documents"]] == ["Text of the whole document"]
+    mock_engine.partition.assert_called_once()
+
+
+def test_parallel_mode_partitions_small_documents_in_process_without_the_engine(monkeypatch):
+    """
+    Verify that a document that fits in a single split does not start a partition engine when
+    it is disabled
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "10")
+    monkeypatch.delenv("UNSTRUCTURED_PARTITION_ENGINE_WORKERS", raising=False)
+    mock_partition = Mock(return_value=[Text("Text of the whole document")])
+    monkeypatch.setattr(general, "partition", mock_partition)
+    monkeypatch.setattr(
+        general, "get_local_split_engine", Mock(side_effect=AssertionError("engine started"))
+    )
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "DA-1p-with-duplicate-pages.pdf"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "application/pdf"))],
+    )
+
+    assert response.status_code == 200
+    assert [e["text"] for e in response.json()["documents"]] == ["Text of the whole document"]
+    mock_partition.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    ("failing_page", "expected_status", "expected_texts"),
+    [
+        # -- a later chunk fails once the response started, and ends it with an error part --
+        (2, 200, [["Text on page 1"]]),
+        # -- the first chunk fails before the response starts, and gets its error status --
+        (1, 400, None),
+    ],
+)
+def test_parallel_mode_stream_reports_errors_of_a_chunk(
+    monkeypatch, failing_page, expected_status, expected_texts
+):
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_BACKEND", "local")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "1")
+
+    def mock_partition(file, starting_page_number, **kwargs):
+        if starting_page_number == failing_page:
+            raise ValueError("Invalid file")
+        return [Text(f"Text on page {starting_page_number}")]
+
+    mock_engine = Mock(max_workers=1)
+    mock_engine.partition.side_effect = mock_partition
+    monkeypatch.setattr(general, "get_local_split_engine", lambda: mock_engine)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "DA-1p-with-duplicate-pages.pdf"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "application/pdf"))],
+        data={"stream_pdf_pages": "true"},
+    )
+
+    assert response.status_code == expected_status
+    if expected_texts is None:
+        assert response.json()["detail"] == "application/pdf not currently supported"
+        return
+    *parts, error = [json.loads(part) for part in read_multipart_parts(response)]
+    assert [[e["text"] for e in part["documents"]] for part in parts] == expected_texts
+    assert error == {"detail": "application/pdf not currently supported", "status_code": 400}
+
+
+@pytest.mark.parametrize(
+    ("page_costs", "concurrency", "min_pages", "max_pages", "expected_ranges"),
+    [
+        # -- one balanced range per worker --
+        ([1] * 10, 3, 1, 50, [(0, 4), (4, 7), (7, 10)]),
+        # -- a small document is not split into more ranges than it has pages --
+        ([1] * 2, 3, 1, 50, [(0, 1), (1, 2)]),
+        # -- or not split at all when it is under the minimum --
+        ([1] * 2, 3, 4, 50, [(0, 2)]),
+        # -- a large document gets as few ranges as the maximum allows --
+        ([1] * 2000, 3, 1, 50, [(start, start + 50) for start in range(0, 2000, 50)]),
+        # -- scanned pages weigh more, so they get ranges of their own --
+        ([1, 1, 1, 1, 4, 4], 3, 1, 50, [(0, 4), (4, 5), (5, 6)]),
+        # -- a tail under the minimum joins the previous range --
+        ([1] * 7, 2, 3, 50, [(0, 4), (4, 7)]),
+        ([1] * 7, 3, 3, 50, [(0, 3), (3, 7)]),
+    ],
+)
+def test_plan_split_ranges(page_costs, concurrency, min_pages, max_pages, expected_ranges):
+    ranges = general.plan_split_ranges(
+        page_costs, concurrency=concurrency, min_pages=min_pages, max_pages=max_pages
+    )
+
+    assert ranges == expected_ranges
+
+
+def test_get_split_ranges_uses_fixed_split_size_by_default(monkeypatch):
+    monkeypatch.delenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", raising=False)
+
+    assert general.get_split_ranges(page_count=3, concurrency=2) == [(0, 1), (1, 2), (2, 3)]
+
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "auto")
+
+    assert general.get_split_ranges(page_count=3, concurrency=2) == [(0, 2), (2, 3)]
+
+
+def test_get_split_ranges_cuts_where_the_strategy_changes(monkeypatch):
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "3")
+
+    ranges = general.get_split_ranges(
+        page_count=6,
+        concurrency=2,
+        page_strategies=["fast", "hi_res", "hi_res", "hi_res", "fast", "fast"],
+    )
+
+    assert ranges == [(0, 1), (1, 3), (3, 4), (4, 6)]
+
+
+def make_pdf_with_scanned_pages(layout: str) -> bytes:
+    """Make a pdf with a text page for every "t" in `layout` and a scanned page for every "s"."""
+    text_pdf = pdfium.PdfDocument(str(Path("sample-docs") / "list-item-example.pdf"))
+    pdf = pdfium.PdfDocument.new()
+    for index, kind in enumerate(layout):
+        if kind == "t":
+            pdf.import_pages(text_pdf, pages=[0], index=index)
+            continue
+        page = pdf.new_page(612, 792)
+        image = pdfium.PdfImage.new(pdf)
+        image.load_jpeg(str(Path("sample-docs") / "layout-parser-paper-fast.jpg"))
+        image.set_matrix(pdfium.PdfMatrix().scale(612, 792))
+        page.insert_obj(image)
+        page.gen_content()
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("strategy", "scanned_page_strategy", "expected_strategies"),
+    [
+        ("auto", None, ["fast", "hi_res", "hi_res", "fast"]),
+        ("auto", "ocr_only", ["fast", "ocr_only", "ocr_only", "fast"]),
+        # -- an explicit strategy is used for every page --
+        ("hi_res", None, ["hi_res"] * 4),
+    ],
+)
+def test_route_page_strategies(monkeypatch, strategy, scanned_page_strategy, expected_strategies):
+    if scanned_page_strategy:
+        monkeypatch.setenv(
+            "UNSTRUCTURED_PARALLEL_MODE_SCANNED_PAGE_STRATEGY", scanned_page_strategy
+        )
+    pdf = pdfium.PdfDocument(make_pdf_with_scanned_pages("tsst"))
+
+    page_profiles = general.profile_pdf_pages(pdf, len(pdf))
+
+    assert [profile.is_scanned for profile in page_profiles] == [False, True, True, False]
+    assert general.route_page_strategies(strategy, page_profiles) == expected_strategies
+
+
+def test_parallel_mode_routes_scanned_pages_to_hi_res(monkeypatch):
+    """
+    Verify that with the auto strategy, text pages are sent with fast and scanned pages with hi_res,
+    and that the elements still come back in page order
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "unused")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "4")
+
+    calls = []
+
+    async def mock_call_api(client, url, api_key, filename, file, content_type, **kwargs):
+        page_count = len(pdfium.PdfDocument(file))
+        page_number = kwargs["starting_page_number"]
+        calls.append((page_number, page_count, kwargs["strategy"]))
+        return json.dumps([Text(f"{kwargs['strategy']} text on page {page_number}").to_dict()])
+
+    monkeypatch.setattr(general, "call_api", mock_call_api)
+
+    client = TestClient(app)
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", ("scanned.pdf", make_pdf_with_scanned_pages("tsst"), "application/pdf"))],
+    )
+
+    assert response.status_code == 200
+    assert sorted(calls) == [(1, 1, "fast"), (2, 2, "hi_res"), (4, 1, "fast")]
+    assert [e["text"] for e in response.json()["documents"]] == [
+        "fast text on page 1",
+        "hi_res text on page 2",
+        "fast text on page 4",
+    ]
+
+
+def test_parallel_mode_partial_results_recover_failed_splits(monkeypatch):
+    """
+    Verify that a failed split is retried in halves, then locally, and that the pages that still
+    fail are reported instead of failing the document
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "unused")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "2")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_PARTIAL_RESULTS", "true")
+
+    async def mock_call_api(client, url, api_key, filename, file, content_type, **kwargs):
+        page_count = len(pdfium.PdfDocument(file))
+        page_number = kwargs["starting_page_number"]
+        if page_count > 1 or page_number == 2:
+            raise HTTPException(status_code=502)
+        return json.dumps([Text(f"Text on page {page_number}").to_dict()])
+
+    def mock_partition(file, starting_page_number, **kwargs):
+        raise ValueError(f"Page {starting_page_number} is broken")
+
+    monkeypatch.setattr(general, "call_api", mock_call_api)
+    monkeypatch.setattr(general, "partition", mock_partition)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "DA-1p-with-duplicate-pages.pdf"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "application/pdf"))],
+    )
+
+    assert response.status_code == 200
+    assert [e["text"] for e in response.json()["documents"]] == [
+        "Text on page 1",
+        "Text on page 3",
+    ]
+    assert response.json()["metadata"]["failed_pages"] == [2]
+
+
+@pytest.mark.parametrize(
+    ("filename", "content_type", "format_name"),
+    [
+        (
+            "sheets.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            "xlsx",
+        ),
+        (
+            "slides.pptx",
+            "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            "pptx",
+        ),
+        ("frames.tiff", "image/tiff", "tiff"),
+    ],
+)
+def test_parallel_mode_rejects_documents_it_cannot_split(
+    monkeypatch, filename, content_type, format_name
+):
+    """
+    Verify that a corrupt document is reported as a 422 in parallel mode, like an invalid pdf
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "unused")
+    remote_partition = Mock()
+    monkeypatch.setattr(general, "call_api", remote_partition)
+
+    client = TestClient(app)
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (filename, b"not a document at all", content_type))],
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == f"File does not appear to be a valid {format_name}"
+    remote_partition.assert_not_called()
+
+
+def test_parallel_mode_splits_xlsx_by_sheet(monkeypatch):
+    """
+    Verify that a workbook is split by sheet in parallel mode, and that the elements come back in
+    sheet order with the page numbers of the whole workbook
+    """
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_ENABLED", "true")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "unused")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_SPLIT_SIZE", "2")
+
+    async def mock_call_api(client, url, api_key, filename, file, content_type, **kwargs):
+        sheet_names = openpyxl.load_workbook(file).sheetnames
+        elements = []
+        for page_number, sheet_name in enumerate(sheet_names, kwargs["starting_page_number"]):
+            element = Text(sheet_name)
+            element.metadata.page_number = page_number
+            elements.append(element.to_dict())
+        return json.dumps(elements)
+
+    monkeypatch.setattr(general, "call_api", mock_call_api)
+
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for index in range(5):
+        workbook.create_sheet(f"Sheet {index + 1}").append(["Sheet", index + 1])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    client = TestClient(app)
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[
+            (
+                "files",
+                (
+                    "sheets.xlsx",
+                    buffer.getvalue(),
+                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                ),
+            )
+        ],
+    )
+
+    assert response.status_code == 200
+    assert [(e["text"], e["metadata"]["page_number"]) for e in response.json()["documents"]] == [
+        (f"Sheet {page_number}", page_number) for page_number in range(1, 6)
+    ]
+
+
+COUNT_FIELDS = [
+    "words_count",
+    "sentences_count",
+    "paragraphs_count",
+    "tokens_count",
+    "characters_count",
+]
+
+
+@pytest.mark.parametrize(
+    ("data", "expected_fields"),
+    [
+        ({}, COUNT_FIELDS),
+        ({"metrics": "words,characters"}, ["words_count", "characters_count"]),
+        ({"metrics": ["tokens", "words"]}, ["words_count", "tokens_count"]),
+        ({"metrics": "none"}, []),
+    ],
+)
+def test_metrics_selects_the_counters(monkeypatch, data, expected_fields):
+    """
+    Verify that only the counters asked for in `metrics` are computed, and that the others are
+    left out of the element metadata and null in the response metadata
+    """
+    monkeypatch.setattr(
+        general, "partition", lambda **kwargs: [Text("One sentence. Two sentences!")]
+    )
+    monkeypatch.setattr(general, "get_text_stats_cache", lambda: None)
+    tokenizer_encode = Mock(wraps=general.tokenizer.encode)
+    monkeypatch.setattr(general.tokenizer, "encode", tokenizer_encode)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))],
+        data=data,
+    )
+
+    assert response.status_code == 200
+    metadata = response.json()["metadata"]
+    element_metadata = response.json()["documents"][0]["metadata"]
+    assert [field for field in COUNT_FIELDS if metadata[field] is not None] == expected_fields
+    assert [field for field in COUNT_FIELDS if field in element_metadata] == expected_fields
+    if "words_count" in expected_fields:
+        assert metadata["words_count"] == element_metadata["words_count"] == 4
+    assert tokenizer_encode.called == ("tokens_count" in expected_fields)
+
+
+def test_invalid_metrics_returns_400():
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))],
+        data={"metrics": "words,pages"},
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid metrics: pages.")
+
+
+@pytest.mark.parametrize("file_count", [1, 2])
+def test_json_response_bytes_match_the_default_encoder(monkeypatch, file_count):
+    """
+    Verify that partition responses are written to the same bytes FastAPI would have produced
+    with `jsonable_encoder`
+    """
+    monkeypatch.setattr(
+        general,
+        "partition",
+        lambda **kwargs: [Title("Résumé ✓"), Text('Quotes " and \\ backslashes\n')],
+    )
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))] * file_count,
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    content = response.json()
+    expected = (
+        [general.PartitionResponse(**document) for document in content]
+        if file_count > 1
+        else general.PartitionResponse(**content)
+    )
+    assert response.content == JSONResponse(jsonable_encoder(expected)).body
+
+
+@pytest.mark.parametrize("file_count", [1, 2])
+def test_ndjson_output_streams_one_element_per_line(monkeypatch, file_count):
+    """
+    Verify that the application/x-ndjson output format sends a line per element, followed by a
+    metadata line with the counts of the document
+    """
+    monkeypatch.setattr(
+        general,
+        "partition",
+        lambda **kwargs: [Title("Title"), Text(""), Text("One sentence. Two sentences!")],
+    )
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))] * file_count,
+        data={"output_format": "application/x-ndjson", "metrics": "words"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 3 * file_count
+    for document_lines in zip(*[iter(lines)] * 3):
+        assert [line.get("text") for line in document_lines[:2]] == [
+            "Title",
+            "One sentence. Two sentences!",
+        ]
+        assert document_lines[1]["metadata"]["words_count"] == 4
+        assert document_lines[2]["metadata"]["words_count"] == 5
+        assert "failed_pages" not in document_lines[2]["metadata"]
+
+
+def test_csv_of_several_files_is_joined_in_upload_order(monkeypatch):
+    """
+    Verify that the csv rows of several files are sent in upload order, under the union of their
+    columns
+    """
+
+    def partition(**kwargs):
+        element = Text(f"Text of {kwargs['metadata_filename']}")
+        if kwargs["metadata_filename"].endswith("b.txt"):
+            element.metadata.page_number = 2
+        return [element, Title("Title")]
+
+    monkeypatch.setattr(general, "partition", partition)
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[
+            ("files", (name, open(test_file, "rb"), "text/plain")) for name in ["a.txt", "b.txt"]
+        ],
+        data={"output_format": "text/csv"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    df = pd.read_csv(io.StringIO(response.text), index_col=0)
+    assert list(df.index) == [0, 1, 2, 3]
+    assert list(df["text"]) == ["Text of a.txt", "Title", "Text of b.txt", "Title"]
+    assert list(df["filename"]) == ["a.txt", "a.txt", "b.txt", "b.txt"]
+    assert df["page_number"].isna().tolist() == [True, True, False, True]
+
+
+@pytest.mark.parametrize("output_format", arrow.ARROW_FORMATS)
+def test_arrow_output_formats_write_typed_columns(monkeypatch, output_format):
+    """
+    Verify that the Arrow and Parquet output formats hold a row per element, in upload order, under
+    the union of the columns of every file, with typed columns
+    """
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    def partition(**kwargs):
+        element = Text(f"Text of {kwargs['metadata_filename']}")
+        if kwargs["metadata_filename"].endswith("b.txt"):
+            element.metadata.page_number = 2
+        return [element]
+
+    monkeypatch.setattr(general, "partition", partition)
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[
+            ("files", (name, open(test_file, "rb"), "text/plain")) for name in ["a.txt", "b.txt"]
+        ],
+        data={"output_format": output_format, "metrics": "words"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == output_format
+    table = (
+        pq.read_table(io.BytesIO(response.content))
+        if output_format == arrow.PARQUET
+        else pa.ipc.open_stream(response.content).read_all()
+    )
+    assert table.column("text").to_pylist() == ["Text of a.txt", "Text of b.txt"]
+    assert table.column("page_number").to_pylist() == [None, 2]
+    assert pa.types.is_integer(table.schema.field("words_count").type)
+
+
+def test_arrow_output_formats_require_pyarrow(monkeypatch):
+    monkeypatch.setattr(arrow, "pa", None)
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))],
+        data={"output_format": arrow.PARQUET},
+    )
+
+    assert response.status_code == 400
+    assert "pyarrow" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("binary_parts", [False, True])
+def test_multipart_parts_are_sent_binary_on_request(monkeypatch, binary_parts):
+    """
+    Verify that with binary_parts, multipart parts are sent as they are instead of base64 encoded
+    """
+    monkeypatch.setattr(
+        general, "partition", lambda **kwargs: [Text(f"Text of {kwargs['metadata_filename']}")]
+    )
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[
+            ("files", (name, open(test_file, "rb"), "text/plain")) for name in ["a.txt", "b.txt"]
+        ],
+        data={"binary_parts": str(binary_parts).lower()},
+        headers={"Accept": "multipart/mixed"},
+    )
+
+    assert response.status_code == 200
+    boundary = response.headers["content-type"].split('boundary="')[1].rstrip('"')
+    parts = response.content.split(b"--" + boundary.encode() + b"\r\n")[1:]
+    assert len(parts) == 2
+    texts = []
+    for part in parts:
+        head, body = part.split(b"\r\n\r\n", 1)
+        headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n"))
+        assert headers["Content-Transfer-Encoding"] == ("binary" if binary_parts else "base64")
+        body = body[: int(headers["Content-Length"])]
+        body = body if binary_parts else base64.b64decode(body)
+        texts.append([element["text"] for element in json.loads(body)["documents"]])
+    assert texts == [["Text of a.txt"], ["Text of b.txt"]]
+
+
+@pytest.mark.parametrize(
+    ("output_format", "fields", "metadata_fields", "expected"),
+    [
+        (
+            "application/json",
+            "type,text",
+            "page_number",
+            {"type": "Title", "text": "Title", "metadata": {"page_number": 2}},
+        ),
+        ("application/json", "text", None, {"text": "Title"}),
+        (
+            "application/x-ndjson",
+            None,
+            "page_number,filename",
+            {
+                "type": "Title",
+                "element_id": "id",
+                "text": "Title",
+                "metadata": {"page_number": 2, "filename": "fake-text.txt"},
+            },
+        ),
+        ("text/csv", "text", "page_number", {"text": "Title", "page_number": 2}),
+    ],
+)
+def test_fields_project_the_returned_elements(
+    monkeypatch, output_format, fields, metadata_fields, expected
+):
+    """
+    Verify that fields and metadata_fields keep only the asked for keys of every element
+    """
+
+    def partition(**kwargs):
+        element = Title("Title", element_id="id")
+        element.metadata.page_number = 2
+        element.metadata.languages = ["eng"]
+        return [element]
+
+    monkeypatch.setattr(general, "partition", partition)
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+    data = {"output_format": output_format, "metrics": "words"}
+    if fields is not None:
+        data["fields"] = fields
+    if metadata_fields is not None:
+        data["metadata_fields"] = metadata_fields
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))],
+        data=data,
+    )
+
+    assert response.status_code == 200
+    if output_format == "text/csv":
+        elements = pd.read_csv(io.StringIO(response.text)).to_dict(orient="records")
+    elif output_format == "application/x-ndjson":
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        elements = lines[:-1]
+        assert lines[-1]["metadata"]["words_count"] == 1
+    else:
+        elements = response.json()["documents"]
+    assert elements == [expected]
+
+
+@pytest.mark.parametrize(
+    ("output_format", "tokenized"),
+    [("application/json", True), ("text/csv", False)],
+)
+def test_metadata_fields_skip_the_counters_nothing_reports(monkeypatch, output_format, tokenized):
+    """
+    Verify that a counter left out of metadata_fields is only computed for the response totals,
+    which the csv output does not have
+    """
+    monkeypatch.setattr(
+        general, "partition", lambda **kwargs: [Text("One sentence. Two sentences!")]
+    )
+    monkeypatch.setattr(general, "get_text_stats_cache", lambda: None)
+    tokenizer_encode = Mock(wraps=general.tokenizer.encode)
+    monkeypatch.setattr(general.tokenizer, "encode", tokenizer_encode)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))],
+        data={
+            "output_format": output_format,
+            "metrics": "words,tokens",
+            "metadata_fields": "words_count",
+        },
+    )
+
+    assert response.status_code == 200
+    assert tokenizer_encode.called == tokenized
+    if output_format == "text/csv":
+        [element] = pd.read_csv(io.StringIO(response.text)).to_dict(orient="records")
+        assert element["words_count"] == 4
+        assert "tokens_count" not in element
+    else:
+        assert response.json()["documents"][0]["metadata"] == {"words_count": 4}
+        assert response.json()["metadata"]["tokens_count"] > 0
+
+
+def test_invalid_fields_are_rejected():
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))],
+        data={"fields": "text,page_number"},
+    )
+
+    assert response.status_code == 400
+    assert "page_number" in response.json()["detail"]
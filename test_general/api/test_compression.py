@@ -0,0 +1,131 @@
+import asyncio
+import gzip
+import zlib
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import StreamingResponse
+from unstructured.documents.elements import Text
+
+from prepline_general.api import general
+from prepline_general.api.app import app
+from prepline_general.api.compression import CHUNK_SIZE, CompressionMiddleware, choose_encoding
+
+MAIN_API_ROUTE = "general/v0/general"
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("identity", None),
+        ("*", "br"),
+        ("gzip, br", "br"),
+        ("gzip, br;q=0.8", "gzip"),
+        ("GZIP;Q=1.0", "gzip"),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding, ["br", "gzip"]) == expected
+
+
+def test_partition_response_is_compressed(monkeypatch):
+    monkeypatch.setattr(
+        general, "partition", lambda **kwargs: [Text(f"Element {i}") for i in range(200)]
+    )
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-text.txt"
+
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb"), "text/plain"))],
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert len(response.json()["documents"]) == 200
+
+
+def test_small_response_is_not_compressed():
+    client = TestClient(app)
+
+    response = client.get("/healthcheck", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
+def call_streaming_app(chunks, accept_encoding="gzip", messages=None):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    messages = [] if messages is None else messages
+
+    async def receive():
+        # -- the client never disconnects --
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    asyncio.run(CompressionMiddleware(StreamingResponse(stream()))(scope, receive, send))
+    return messages
+
+
+def test_streamed_response_is_flushed_as_it_is_sent():
+    chunks = [bytes([65 + i]) * CHUNK_SIZE for i in range(3)]
+
+    messages = call_streaming_app(chunks)
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    bodies = [message["body"] for message in messages[1:]]
+    assert [message["more_body"] for message in messages[1:]] == [True, True, True, False]
+    # -- what was sent for the first chunk decodes to that chunk, without waiting for the rest --
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(bodies[0]) == chunks[0]
+    assert gzip.decompress(b"".join(bodies)) == b"".join(chunks)
+
+
+def test_stream_is_compressed_from_its_first_message():
+    messages = []
+    sent_before_second_line = []
+
+    def lines():
+        yield b'{"text": "One"}\n'
+        sent_before_second_line.append(len(messages))
+        yield b'{"text": "Two"}\n'
+
+    call_streaming_app(lines(), messages=messages)
+
+    assert dict(messages[0]["headers"])[b"content-encoding"] == b"gzip"
+    # -- the start and the first line are not held back until `min_size` bytes are streamed --
+    assert sent_before_second_line == [2]
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decoder.decompress(messages[1]["body"]) == b'{"text": "One"}\n'
+    assert gzip.decompress(b"".join(message["body"] for message in messages[1:])) == (
+        b'{"text": "One"}\n{"text": "Two"}\n'
+    )
+
+
+def test_every_streamed_message_is_flushed():
+    lines = [b"x" * 2000 + b"\n", b'{"text": "One"}\n', b'{"text": "Two"}\n']
+
+    messages = call_streaming_app(lines)
+
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # -- small lines are not held back until enough input is buffered to be worth a flush --
+    assert [decoder.decompress(message["body"]) for message in messages[1:-1]] == lines
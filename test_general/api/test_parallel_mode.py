@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+from unittest.mock import AsyncMock, Mock
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from prepline_general.api import backend_pool, parallel_mode
+from prepline_general.api.app import app
+from prepline_general.api.backend_pool import BackendPool
+from prepline_general.api.parallel_mode import ParallelModeDispatcher
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = ParallelModeDispatcher(
+        concurrency=2, pool_size=2, hedge_percentile=50, hedge_min_samples=3
+    )
+    yield dispatcher
+    dispatcher.close()
+
+
+def test_hedge_delay_is_a_percentile_of_recent_latencies(dispatcher):
+    dispatcher._latencies.extend([0.3, 0.1])
+    assert dispatcher.hedge_delay() is None
+
+    dispatcher._latencies.append(0.2)
+    assert dispatcher.hedge_delay() == 0.2
+
+
+def test_straggler_is_hedged_and_duplicate_wins(dispatcher):
+    dispatcher._latencies.extend([0.01] * 3)
+    issued, won = parallel_mode.hedges_issued.value, parallel_mode.hedges_won.value
+
+    async def send(is_hedge):
+        await asyncio.sleep(0 if is_hedge else 10)
+        return "duplicate" if is_hedge else "original"
+
+    assert dispatcher.run(dispatcher.hedge(send)) == "duplicate"
+    assert parallel_mode.hedges_issued.value == issued + 1
+    assert parallel_mode.hedges_won.value == won + 1
+
+
+def test_fast_call_is_not_hedged(dispatcher):
+    dispatcher._latencies.extend([1.0] * 3)
+    issued = parallel_mode.hedges_issued.value
+    calls = []
+
+    async def send(is_hedge):
+        calls.append(is_hedge)
+        return "original"
+
+    assert dispatcher.run(dispatcher.hedge(send)) == "original"
+    assert calls == [False]
+    assert parallel_mode.hedges_issued.value == issued
+
+
+def test_hedge_fails_only_when_both_calls_fail(dispatcher):
+    dispatcher._latencies.extend([0.01] * 3)
+
+    async def send(is_hedge):
+        await asyncio.sleep(0.1 if is_hedge else 0.05)
+        raise HTTPException(status_code=502 if is_hedge else 500)
+
+    with pytest.raises(HTTPException) as excinfo:
+        dispatcher.run(dispatcher.hedge(send))
+
+    assert excinfo.value.status_code == 500
+
+
+def test_metrics_endpoint_reports_hedges():
+    client = TestClient(app)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "# TYPE unstructured_parallel_mode_hedges_issued_total counter" in response.text
+    assert (
+        f"unstructured_parallel_mode_hedges_won_total {parallel_mode.hedges_won.value}"
+        in response.text
+    )
+
+
+def lease_url(pool, exclude=()):
+    with pool.lease(exclude=exclude) as backend:
+        return backend.url
+
+
+def fail_on(pool, url, status_code=502):
+    with pytest.raises(HTTPException):
+        with pool.lease() as backend:
+            assert backend.url == url
+            raise HTTPException(status_code=status_code)
+
+
+def test_backend_pool_picks_least_outstanding_backend(monkeypatch):
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "http://a/general, http://b/general")
+    pool = BackendPool()
+
+    with pool.lease() as first:
+        with pool.lease() as second:
+            assert {first.url, second.url} == {"http://a/general", "http://b/general"}
+            with pool.lease(exclude=[first]) as third:
+                assert third is second
+
+    assert [backend.outstanding for backend in pool.backends()] == [0, 0]
+
+
+def test_backend_pool_circuit_breaker(monkeypatch):
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "http://a/general,http://b/general")
+    pool = BackendPool(failure_threshold=2, cooldown=0.2)
+    a, b = pool.backends()
+    opened = backend_pool.circuits_opened.value
+
+    # -- a client error says nothing about the backend --
+    b.outstanding = 100
+    fail_on(pool, a.url, status_code=400)
+    fail_on(pool, a.url)
+    assert a.open_until == 0
+    fail_on(pool, a.url)
+    assert a.open_until > 0
+    assert backend_pool.circuits_opened.value == opened + 1
+
+    assert {lease_url(pool) for _ in range(5)} == {b.url}
+
+    # -- after the cooldown a trial request is let through, and closes the circuit --
+    time.sleep(0.2)
+    assert lease_url(pool) == a.url
+    assert a.open_until == 0 and a.consecutive_failures == 0
+
+
+def test_backend_pool_fails_open_with_a_single_backend(monkeypatch):
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "http://a/general")
+    pool = BackendPool(failure_threshold=1, cooldown=60)
+
+    fail_on(pool, "http://a/general")
+
+    assert lease_url(pool) == "http://a/general"
+
+
+def test_backend_pool_reads_discovery_file(monkeypatch, tmp_path):
+    url_file = tmp_path / "backends.txt"
+    url_file.write_text("# pods\nhttp://a/general\n\nhttp://b/general  # zone b\n")
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL_FILE", str(url_file))
+    pool = BackendPool()
+
+    a, b = pool.backends()
+    assert [a.url, b.url] == ["http://a/general", "http://b/general"]
+
+    a.outstanding = 3
+    url_file.write_text("http://a/general\nhttp://c/general\n")
+    os.utime(url_file, (0, 1))
+
+    backends = pool.backends()
+    assert [backend.url for backend in backends] == ["http://a/general", "http://c/general"]
+    assert backends[0] is a
+
+
+def test_backend_pool_ejects_unhealthy_backends(monkeypatch):
+    monkeypatch.setenv("UNSTRUCTURED_PARALLEL_MODE_URL", "http://a/general,http://b/general")
+    pool = BackendPool()
+
+    async def get(url, **kwargs):
+        if url == "http://a/healthcheck":
+            raise httpx.ConnectError("refused")
+        return Mock(status_code=200)
+
+    asyncio.run(pool.check_health(AsyncMock(get=get)))
+
+    assert [backend.healthy for backend in pool.backends()] == [False, True]
+    assert {lease_url(pool) for _ in range(5)} == {"http://b/general"}
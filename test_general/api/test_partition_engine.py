@@ -0,0 +1,74 @@
+import os
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unstructured.partition.auto import partition
+
+from prepline_general.api import general, partition_engine
+from prepline_general.api.app import app
+from prepline_general.api.partition_engine import PartitionEngine, get_partition_engine
+
+MAIN_API_ROUTE = "general/v0/general"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = PartitionEngine(max_workers=1)
+    yield engine
+    engine.shutdown()
+
+
+def test_engine_matches_in_process_partition(engine):
+    test_file = Path("sample-docs") / "stanley-cups.csv"
+    kwargs = {"content_type": "text/csv", "metadata_filename": str(test_file)}
+
+    with open(test_file, "rb") as f:
+        expected = partition(file=f, **kwargs)
+    with open(test_file, "rb") as f:
+        elements = engine.partition(f, **kwargs)
+
+    assert [e.to_dict() for e in elements] == [e.to_dict() for e in expected]
+
+
+def test_engine_recovers_from_a_crashed_worker(engine):
+    engine._executor.submit(os._exit, 1)
+
+    test_file = Path("sample-docs") / "stanley-cups.csv"
+    with pytest.raises(HTTPException) as excinfo:
+        # -- either the crash is observed here, or the pool was already marked broken --
+        for _ in range(20):
+            with open(test_file, "rb") as f:
+                engine.partition(f, content_type="text/csv")
+
+    assert excinfo.value.status_code == 500
+    with open(test_file, "rb") as f:
+        assert len(engine.partition(f, content_type="text/csv")) > 0
+
+
+def test_engine_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("UNSTRUCTURED_PARTITION_ENGINE_WORKERS", raising=False)
+    monkeypatch.setattr(partition_engine, "_engine", None)
+
+    assert get_partition_engine() is None
+
+
+def test_general_api_uses_engine_when_enabled(monkeypatch):
+    mock_engine = Mock()
+    mock_engine.partition.return_value = []
+    monkeypatch.setattr(general, "get_partition_engine", lambda: mock_engine)
+    mock_partition = Mock(return_value=[])
+    monkeypatch.setattr(general, "partition", mock_partition)
+
+    client = TestClient(app)
+    test_file = Path("sample-docs") / "fake-xml.xml"
+    response = client.post(
+        MAIN_API_ROUTE,
+        files=[("files", (str(test_file), open(test_file, "rb")))],
+    )
+
+    assert response.status_code == 200
+    mock_engine.partition.assert_called_once()
+    mock_partition.assert_not_called()
@@ -0,0 +1,141 @@
+from unittest.mock import Mock
+
+import tiktoken
+from unstructured.documents.coordinates import PixelSpace
+from unstructured.documents.elements import CoordinatesMetadata, NarrativeText, Title
+
+from prepline_general.api import postprocessing
+from prepline_general.api.postprocessing import (
+    CountTextStats,
+    TextStatsCache,
+    clean_text,
+    drop_empty_elements,
+    project_metadata,
+    run_stages,
+    serialize_elements,
+    strip_metadata,
+)
+
+
+def make_elements():
+    elements = [
+        Title("First"),
+        NarrativeText(""),
+        NarrativeText(""),
+        NarrativeText("  two words  "),
+        Title(""),
+    ]
+    for element in elements:
+        element.metadata.file_directory = "/tmp/docs"
+        element.metadata.coordinates = CoordinatesMetadata(
+            points=((0, 0), (1, 1)), system=PixelSpace(1, 1)
+        )
+    return elements
+
+
+def test_run_stages_drops_consecutive_empty_elements():
+    elements = make_elements()
+
+    texts = [element.text for element in run_stages(elements, [drop_empty_elements])]
+
+    assert texts == ["First", "  two words  "]
+    assert len(elements) == 5
+
+
+def test_run_stages_chains_the_stages_lazily():
+    seen = []
+
+    def record(elements):
+        for element in elements:
+            seen.append(element.text)
+            yield element
+
+    stream = run_stages(make_elements(), [drop_empty_elements, record])
+    assert seen == []
+
+    next(stream)
+    assert seen == ["First"]
+
+
+def test_clean_and_strip_metadata_stages():
+    stages = [
+        drop_empty_elements,
+        lambda elements: clean_text(elements, cleanup=str.strip),
+        lambda elements: strip_metadata(elements, filename="/tmp/docs/a.pdf", coordinates=False),
+    ]
+
+    elements = list(run_stages(make_elements(), stages))
+
+    assert [element.text for element in elements] == ["First", "two words"]
+    for element in elements:
+        assert element.metadata.filename == "a.pdf"
+        assert element.metadata.file_directory is None
+        assert element.metadata.coordinates is None
+
+
+def test_count_text_stats_stage_sums_totals_over_batches():
+    count_stats = CountTextStats(
+        ["words", "characters"], tiktoken.get_encoding("o200k_base"), batch_size=2
+    )
+
+    documents = serialize_elements(run_stages(make_elements(), [drop_empty_elements, count_stats]))
+
+    assert [document["metadata"]["words_count"] for document in documents] == [1, 2]
+    assert "tokens_count" not in documents[0]["metadata"]
+    assert count_stats.totals == {"words_count": 3, "characters_count": 18}
+
+
+def test_project_metadata_and_fields_select_what_is_serialized():
+    elements = make_elements()
+    elements[0].metadata.page_number = 3
+    stages = [lambda elements: project_metadata(elements, metadata_fields=["page_number"])]
+
+    documents = serialize_elements(run_stages(elements[:1], stages), fields=["text", "metadata"])
+
+    assert documents == [{"text": "First", "metadata": {"page_number": 3}}]
+
+
+def test_text_stats_cache_counts_each_text_once():
+    encoding = tiktoken.get_encoding("o200k_base")
+    tokenizer_encode = Mock(wraps=encoding.encode)
+    tokenizer = Mock(encode=tokenizer_encode)
+    cache = TextStatsCache(max_size=10)
+    hits = postprocessing.text_stats_cache_hits.value
+    misses = postprocessing.text_stats_cache_misses.value
+
+    first = cache.count(["Header", "Body one", "Header"], tokenizer, ["tokens"], num_threads=1)
+    second = cache.count(["Header", "Body two"], tokenizer, ["tokens"], num_threads=1)
+
+    texts = ["Header", "Body one", "Header", "Header", "Body two"]
+    assert [stats.tokens_count for stats in first + second] == [
+        len(encoding.encode(text)) for text in texts
+    ]
+    assert [call.args[0] for call in tokenizer_encode.call_args_list] == [
+        "Header",
+        "Body one",
+        "Body two",
+    ]
+    assert postprocessing.text_stats_cache_hits.value == hits + 2
+    assert postprocessing.text_stats_cache_misses.value == misses + 3
+
+
+def test_text_stats_cache_adds_missing_counters():
+    tokenizer = tiktoken.get_encoding("o200k_base")
+    cache = TextStatsCache(max_size=10)
+
+    cache.count(["Two words"], tokenizer, ["words"])
+    (stats,) = cache.count(["Two words"], tokenizer, ["characters"])
+
+    assert (stats.words_count, stats.characters_count, stats.tokens_count) == (2, 9, None)
+
+
+def test_text_stats_cache_evicts_least_recently_used():
+    tokenizer = tiktoken.get_encoding("o200k_base")
+    cache = TextStatsCache(max_size=2)
+
+    cache.count(["a", "b"], tokenizer, ["words"])
+    cache.count(["a", "c"], tokenizer, ["words"])
+
+    assert len(cache) == 2
+    assert cache._key("a") in cache._stats
+    assert cache._key("b") not in cache._stats
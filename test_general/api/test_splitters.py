@@ -0,0 +1,126 @@
+import io
+import zipfile
+from pathlib import Path
+
+import openpyxl
+import pypdfium2 as pdfium
+import pytest
+from PIL import Image
+from pptx import Presentation
+from pypdf import PdfReader
+
+from prepline_general.api.splitters import (
+    PptxSplitter,
+    TiffSplitter,
+    XlsxSplitter,
+    get_pdf_splits,
+)
+
+
+def make_xlsx(sheet_count: int) -> bytes:
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for index in range(sheet_count):
+        sheet = workbook.create_sheet(f"Sheet {index + 1}")
+        sheet.append(["Team", "Wins"])
+        sheet.append([f"Team {index + 1}", index])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pptx(slide_count: int) -> bytes:
+    presentation = Presentation()
+    for index in range(slide_count):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+        slide.shapes.title.text = f"Slide {index + 1}"
+        slide.notes_slide.notes_text_frame.text = f"Notes {index + 1}"
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def make_tiff(frame_count: int) -> bytes:
+    frames = [Image.new("L", (20, 10), color=index * 10) for index in range(frame_count)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="TIFF", save_all=True, append_images=frames[1:], dpi=(200, 200))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("split_size", "expected_splits"),
+    [(1, [(1, 0), (1, 1), (1, 2)]), (2, [(2, 0), (1, 2)]), (5, [(3, 0)])],
+)
+def test_get_pdf_splits(split_size, expected_splits):
+    test_file = Path("sample-docs") / "DA-1p-with-duplicate-pages.pdf"
+    pdf = pdfium.PdfDocument(str(test_file))
+
+    splits = [
+        (len(PdfReader(split).pages), offset)
+        for split, offset in get_pdf_splits(pdf, split_size=split_size)
+    ]
+
+    assert splits == expected_splits
+
+
+def test_xlsx_splitter_splits_by_sheet():
+    with XlsxSplitter(io.BytesIO(make_xlsx(3))) as splitter:
+        assert splitter.page_count == 3
+        splits = list(splitter.get_splits([(0, 2), (2, 3)]))
+
+    assert [offset for _, offset in splits] == [0, 2]
+    workbooks = [openpyxl.load_workbook(split) for split, _ in splits]
+    assert [workbook.sheetnames for workbook in workbooks] == [
+        ["Sheet 1", "Sheet 2"],
+        ["Sheet 3"],
+    ]
+    assert list(workbooks[1]["Sheet 3"].values) == [("Team", "Wins"), ("Team 3", 2)]
+
+
+def test_pptx_splitter_splits_by_slide_range():
+    with PptxSplitter(io.BytesIO(make_pptx(5))) as splitter:
+        assert splitter.page_count == 5
+        splits = list(splitter.get_splits([(0, 2), (2, 5)]))
+
+    assert [offset for _, offset in splits] == [0, 2]
+    presentations = [Presentation(split) for split, _ in splits]
+    assert [[slide.shapes.title.text for slide in p.slides] for p in presentations] == [
+        ["Slide 1", "Slide 2"],
+        ["Slide 3", "Slide 4", "Slide 5"],
+    ]
+    assert [slide.notes_slide.notes_text_frame.text for slide in presentations[1].slides] == [
+        "Notes 3",
+        "Notes 4",
+        "Notes 5",
+    ]
+
+
+def test_pptx_splitter_builds_every_split_from_one_presentation():
+    with PptxSplitter(io.BytesIO(make_pptx(4))) as splitter:
+        splits = list(splitter.get_splits([(2, 4), (0, 1), (1, 3)]))
+
+    presentations = [Presentation(split) for split, _ in splits]
+    assert [[slide.shapes.title.text for slide in p.slides] for p in presentations] == [
+        ["Slide 3", "Slide 4"],
+        ["Slide 1"],
+        ["Slide 2", "Slide 3"],
+    ]
+    # -- the slides out of a range are not saved along with the split --
+    slide_parts = [
+        [name for name in zipfile.ZipFile(split).namelist() if name.startswith("ppt/slides/slide")]
+        for split, _ in splits
+    ]
+    assert [len(parts) for parts in slide_parts] == [2, 1, 2]
+
+
+def test_tiff_splitter_splits_by_frame():
+    with TiffSplitter(io.BytesIO(make_tiff(3))) as splitter:
+        assert splitter.page_count == 3
+        splits = list(splitter.get_splits([(0, 1), (1, 3)]))
+
+    assert [offset for _, offset in splits] == [0, 1]
+    images = [Image.open(split) for split, _ in splits]
+    assert [image.n_frames for image in images] == [1, 2]
+    images[1].seek(1)
+    assert images[1].getpixel((0, 0)) == 20
+    assert images[1].info["dpi"] == (200, 200)
@@ -1,8 +1,18 @@
 from typing import Any
 
 import pytest
+import tiktoken
 
-from prepline_general.api.utils import SmartValueParser
+from prepline_general.api.utils import (
+    SmartValueParser,
+    TextStats,
+    count_characters,
+    count_paragraphs,
+    count_sentences,
+    count_text_stats,
+    count_words,
+    scrub_pii,
+)
 
 
 @pytest.mark.parametrize(
@@ -50,3 +60,66 @@ def test_literal_value_stripped_or_first_element(
         value_to_parse
     )
     assert expected_result == parsed_value
+
+
+@pytest.mark.parametrize(("batch_size", "num_threads"), [(1000, 8), (3, 2), (2, 1)])
+def test_count_text_stats(batch_size: int, num_threads: int):
+    tokenizer = tiktoken.get_encoding("o200k_base")
+    texts = [
+        "One sentence. Two sentences!",
+        "A first paragraph?\n\nA second paragraph.",
+        "",
+        "Tokens, tokens and more tokens " * 20,
+        "Ünïcödé text with emojis 🎉🎉",
+    ]
+
+    stats = count_text_stats(texts, tokenizer, batch_size=batch_size, num_threads=num_threads)
+
+    assert stats == [
+        TextStats(
+            words_count=count_words(text),
+            sentences_count=count_sentences(text),
+            paragraphs_count=count_paragraphs(text),
+            tokens_count=len(tokenizer.encode(text)),
+            characters_count=count_characters(text),
+        )
+        for text in texts
+    ]
+
+
+PII_TEXT = (
+    "Mail John.Doe@Example.com or call +34 672013593, (555) 123-4567. "
+    "Card 4111 1111 1111 1111, or 4111-1111-1111-1111."
+)
+
+
+@pytest.mark.parametrize(
+    ("flags", "expected"),
+    [
+        (
+            {"delete_emails": True},
+            "Mail  or call +34 672013593, (555) 123-4567. "
+            "Card 4111 1111 1111 1111, or 4111-1111-1111-1111.",
+        ),
+        (
+            {"delete_credit_cards": True},
+            "Mail John.Doe@Example.com or call +34 672013593, (555) 123-4567. Card , or .",
+        ),
+        (
+            {"delete_emails": True, "delete_credit_cards": True, "delete_phone_numbers": True},
+            "Mail  or call , . Card , or .",
+        ),
+        ({}, PII_TEXT),
+    ],
+)
+def test_scrub_pii(flags: dict[str, bool], expected: str):
+    assert scrub_pii(PII_TEXT, **flags) == expected
+
+
+def test_scrub_pii_prefers_the_longer_kind_of_match():
+    text = "Write to jane.5551234567@example.org about card 4111111111111111"
+
+    assert (
+        scrub_pii(text, delete_emails=True, delete_credit_cards=True, delete_phone_numbers=True)
+        == "Write to  about card "
+    )